@@ -0,0 +1,205 @@
+import os
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from moviepy import AudioFileClip, ImageClip, VideoClip, VideoFileClip
+from moviepy.audio.AudioClip import AudioArrayClip
+
+ASSET_CACHE_MB = int(os.getenv("ASSET_CACHE_MB", "512"))
+
+# Assets usados em todo vídeo: decodificados quando a API ou o worker sobem
+WARM_ASSETS = [
+  ("image", "src/quiz/assets/background-quiz.png", {"new_size": (1080, 1920)}),
+  ("image", "src/countries_fun_facts/assets/background-fun-facts.png", {"new_size": (1080, 1920)}),
+  ("gif", "src/core/assets/clock-gif.gif", {"height": 80}),
+  ("audio", "src/quiz/assets/correct.mp3", {}),
+  ("audio", "src/core/assets/clock.wav", {}),
+  ("audio", "src/countries_fun_facts/assets/background.mp3", {}),
+]
+
+def nbytes(value) -> int:
+  if isinstance(value, np.ndarray):
+    return value.nbytes
+  if isinstance(value, (tuple, list)):
+    return sum(nbytes(item) for item in value)
+  if isinstance(value, dict):
+    return sum(nbytes(item) for item in value.values())
+  return 0
+
+def read_only(array: Optional[np.ndarray]) -> Optional[np.ndarray]:
+  # Os arrays são compartilhados entre vídeos: ninguém pode alterá-los in-place
+  if array is not None:
+    array.flags.writeable = False
+  return array
+
+class LRUCache:
+  """Cache LRU limitado por bytes (arrays numpy), com contadores de hit/miss."""
+
+  def __init__(self, max_bytes: int):
+    self.max_bytes = max_bytes
+    self.entries: "OrderedDict[Any, Tuple[Any, int]]" = OrderedDict()
+    self.lock = threading.Lock()
+    self.loading: Dict[Any, threading.Lock] = {}
+    self.bytes = 0
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def get(self, key):
+    with self.lock:
+      if key in self.entries:
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return self.entries[key][0]
+      self.misses += 1
+      return None
+
+  def put(self, key, value):
+    size = nbytes(value)
+    if size > self.max_bytes:
+      return
+    with self.lock:
+      if key in self.entries:
+        self.bytes -= self.entries.pop(key)[1]
+      self.entries[key] = (value, size)
+      self.bytes += size
+      while self.bytes > self.max_bytes:
+        _, (_, evicted) = self.entries.popitem(last=False)
+        self.bytes -= evicted
+        self.evictions += 1
+
+  def get_or_load(self, key, loader: Callable[[], Any]):
+    value = self.get(key)
+    if value is not None:
+      return value
+    # Um load por chave: threads pedindo o mesmo asset esperam o primeiro decode
+    with self.lock:
+      key_lock = self.loading.setdefault(key, threading.Lock())
+    with key_lock:
+      with self.lock:
+        if key in self.entries:
+          self.entries.move_to_end(key)
+          return self.entries[key][0]
+      value = loader()
+      self.put(key, value)
+    with self.lock:
+      self.loading.pop(key, None)
+    return value
+
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+      self.bytes = 0
+
+  def stats(self) -> dict:
+    with self.lock:
+      total = self.hits + self.misses
+      return {
+        "entries": len(self.entries),
+        "bytes": self.bytes,
+        "max_bytes": self.max_bytes,
+        "hits": self.hits,
+        "misses": self.misses,
+        "evictions": self.evictions,
+        "hit_rate": round(self.hits / total, 3) if total else 0.0,
+      }
+
+class AssetCache:
+  """Frames e PCM dos assets fixos (fundos, bandeiras, GIF do relógio, efeitos sonoros) já decodificados e redimensionados.
+
+  A chave inclui o mtime do arquivo, então trocar um asset em disco invalida a entrada.
+  Os métodos devolvem clips novos a cada chamada, mas apoiados nos mesmos arrays somente leitura.
+  """
+
+  def __init__(self, max_bytes: int = ASSET_CACHE_MB * 1024 * 1024):
+    self.cache = LRUCache(max_bytes)
+
+  def key(self, kind: str, path: str, **target) -> tuple:
+    return (kind, os.path.abspath(path), os.path.getmtime(path), tuple(sorted(target.items())))
+
+  def image_clip(self, path: str, new_size=None, width=None, height=None) -> ImageClip:
+    target = {"new_size": new_size, "width": width, "height": height}
+    frame, mask = self.cache.get_or_load(self.key("image", path, **target), lambda: self.load_image(path, **target))
+    clip = ImageClip(frame)
+    if mask is not None:
+      clip = clip.with_mask(ImageClip(mask, is_mask=True))
+    return clip
+
+  def load_image(self, path: str, **target):
+    clip = ImageClip(path)
+    if any(value is not None for value in target.values()):
+      clip = clip.resized(**target)
+    mask = clip.mask.get_frame(0) if clip.mask is not None else None
+    return read_only(clip.get_frame(0)), read_only(mask)
+
+  def video_clip(self, path: str, has_mask: bool = False, new_size=None, width=None, height=None) -> VideoClip:
+    """Equivalente a VideoFileClip(path, has_mask).resized(...) com todos os frames em memória (GIFs curtos)."""
+    target = {"new_size": new_size, "width": width, "height": height, "has_mask": has_mask}
+    frames, masks, fps = self.cache.get_or_load(self.key("video", path, **target), lambda: self.load_video(path, **target))
+    duration = len(frames) / fps
+
+    def frame_index(t):
+      # Mesmo arredondamento do FFMPEG_VideoReader; depois do fim repete o último frame
+      return min(int(fps * t + 0.00001), len(frames) - 1)
+
+    clip = VideoClip(lambda t: frames[frame_index(t)], duration=duration)
+    clip.fps = fps
+    if masks is not None:
+      clip = clip.with_mask(VideoClip(lambda t: masks[frame_index(t)], is_mask=True, duration=duration))
+    return clip
+
+  def load_video(self, path: str, has_mask: bool, **target):
+    clip = VideoFileClip(path, has_mask=has_mask)
+    try:
+      n_frames, fps = clip.reader.n_frames, clip.fps
+      if any(value is not None for value in target.values()):
+        clip = clip.resized(**target)
+      frames = np.stack([clip.get_frame(i / fps) for i in range(n_frames)])
+      masks = np.stack([clip.mask.get_frame(i / fps) for i in range(n_frames)]) if has_mask else None
+    finally:
+      clip.close()
+    return read_only(frames), read_only(masks), fps
+
+  def audio_clip(self, path: str) -> AudioArrayClip:
+    samples, fps = self.audio_samples(path)
+    return AudioArrayClip(samples, fps=fps)
+
+  def audio_samples(self, path: str) -> Tuple[np.ndarray, int]:
+    """PCM float (amostras x canais) e a taxa de amostragem do arquivo."""
+    return self.cache.get_or_load(self.key("audio", path), lambda: self.load_audio(path))
+
+  def load_audio(self, path: str):
+    clip = AudioFileClip(path)
+    try:
+      # float32: metade da memória, e a trilha acaba quantizada em 16 bits de qualquer forma
+      samples = clip.to_soundarray(fps=clip.fps).astype(np.float32)
+    finally:
+      clip.close()
+    return read_only(samples), clip.fps
+
+  def warm(self, assets=WARM_ASSETS):
+    for kind, path, target in assets:
+      if not os.path.exists(path):
+        print(f"⚠️ Asset {path} não encontrado, sem pré-carga")
+        continue
+      try:
+        if kind == "image":
+          self.image_clip(path, **target)
+        elif kind == "gif":
+          self.video_clip(path, has_mask=True, **target)
+        elif kind == "audio":
+          self.audio_clip(path)
+      except Exception as e:
+        print(f"Erro ao pré-carregar {path}: {e}")
+    stats = self.stats()
+    print(f"🗃️ Cache de assets aquecido: {stats['entries']} itens, {stats['bytes'] / 1024 / 1024:.1f} MB")
+
+  def stats(self) -> dict:
+    return self.cache.stats()
+
+asset_cache = AssetCache()
+
+def warm_asset_cache():
+  # Função de módulo para servir de initializer de processos (spawn)
+  asset_cache.warm()
@@ -1,10 +1,13 @@
+import os
+import tempfile
 import numpy as np
 from moviepy.audio.AudioClip import AudioArrayClip
 from google.cloud import texttospeech
+from core.commons.tts_cache import tts_cache
 
-def generate_tts(text, language="pt-br", voice_name=None, speaking_rate=1.0, ssml=False):
-    client = texttospeech.TextToSpeechClient()
+AUDIO_SUFFIXES = {"MP3": ".mp3", "LINEAR16": ".wav", "OGG_OPUS": ".ogg"}
 
+def build_tts_request(text, language="pt-br", voice_name=None, speaking_rate=1.0, ssml=False):
     if language == "pt-br":
         language_code = "pt-BR"
         if not voice_name:
@@ -29,8 +32,62 @@ def generate_tts(text, language="pt-br", voice_name=None, speaking_rate=1.0, ssm
     else:
         synthesis_input = texttospeech.SynthesisInput(text=text)
 
-    response = client.synthesize_speech(input=synthesis_input, voice=voice, audio_config=audio_config)
-    return response.audio_content
+    return {"input": synthesis_input, "voice": voice, "audio_config": audio_config}
+
+def tts_cache_key(request):
+    """Chave do cache: tudo o que muda o áudio sintetizado."""
+    synthesis_input, voice, audio_config = request["input"], request["voice"], request["audio_config"]
+    encoding = texttospeech.AudioEncoding(audio_config.audio_encoding).name
+    key = tts_cache.key(
+        ssml=synthesis_input.ssml,
+        text=synthesis_input.text,
+        voice=voice.name,
+        language=voice.language_code,
+        rate=audio_config.speaking_rate,
+        encoding=encoding,
+    )
+    return key, AUDIO_SUFFIXES.get(encoding, ".bin")
+
+def cached_tts(text, language="pt-br", voice_name=None, speaking_rate=1.0, ssml=False):
+    """Pedido do TTS, chave/extensão no cache e, num hit, a cópia do áudio para o job (ou None)."""
+    request = build_tts_request(text, language, voice_name, speaking_rate, ssml)
+    key, suffix = tts_cache_key(request)
+    path = tts_cache.get(key, suffix)
+    return request, key, suffix, path and tts_cache.job_copy(path)
+
+def store_tts(key, suffix, audio_content):
+    """Grava a síntese no cache e devolve a cópia do job; com o cache desligado (ou falhando), um temporário."""
+    path = tts_cache.put(key, audio_content, suffix)
+    return (path and tts_cache.job_copy(path)) or save_audio(audio_content, suffix)
+
+def generate_tts_file(text, language="pt-br", voice_name=None, speaking_rate=1.0, ssml=False):
+    """Caminho de um áudio do TTS só do chamador (a eviction do cache não o apaga); quem chama o remove quando terminar."""
+    request, key, suffix, path = cached_tts(text, language, voice_name, speaking_rate, ssml)
+    if path:
+        return path
+    response = texttospeech.TextToSpeechClient().synthesize_speech(**request)
+    return store_tts(key, suffix, response.audio_content)
+
+async def generate_tts_file_async(text, language="pt-br", voice_name=None, speaking_rate=1.0, ssml=False):
+    request, key, suffix, path = cached_tts(text, language, voice_name, speaking_rate, ssml)
+    if path:
+        return path
+    response = await texttospeech.TextToSpeechAsyncClient().synthesize_speech(**request)
+    return store_tts(key, suffix, response.audio_content)
+
+def generate_tts(text, language="pt-br", voice_name=None, speaking_rate=1.0, ssml=False):
+    """Bytes do áudio, pelo mesmo caminho (e cache) do generate_tts_file."""
+    path = generate_tts_file(text, language, voice_name, speaking_rate, ssml)
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+def save_audio(audio_content, suffix=".mp3"):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as f:
+        f.write(audio_content)
+        return f.name
 
 def create_silence(duration, fps=44100):
     n_samples = int(duration * fps)
@@ -0,0 +1,94 @@
+import os
+import subprocess
+import psutil
+from moviepy.config import FFMPEG_BINARY
+from typing import List, Optional, Tuple
+
+def kill_writers(paths: List[str]) -> int:
+  """Mata os processos ffmpeg filhos deste processo que estão escrevendo algum dos arquivos."""
+  targets = set(paths) | {os.path.abspath(path) for path in paths}
+  killed = 0
+  for child in psutil.Process().children(recursive=True):
+    try:
+      cmdline = child.cmdline()
+      if cmdline and "ffmpeg" in os.path.basename(cmdline[0]) and targets.intersection(cmdline):
+        child.kill()
+        killed += 1
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+      continue
+  return killed
+
+def run_ffmpeg(args: List[str]):
+  cmd = [FFMPEG_BINARY, "-y", "-loglevel", "error"] + args
+  result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+  if result.returncode != 0:
+    raise IOError(f"ffmpeg falhou ({' '.join(cmd)}): {result.stderr.decode(errors='ignore').strip()}")
+
+def write_concat_list(segment_paths: List[str], list_path: str):
+  with open(list_path, "w") as f:
+    for path in segment_paths:
+      escaped = os.path.abspath(path).replace("'", "'\\''")
+      f.write(f"file '{escaped}'\n")
+
+def concat_segments(segment_paths: List[str], output_path: str, audio_path: Optional[str] = None):
+  """Junta segmentos com os mesmos parâmetros de codec via concat demuxer (stream copy, sem re-encode).
+
+  Se audio_path vier, a trilha é multiplexada no lugar do áudio dos segmentos.
+  """
+  list_path = output_path + ".concat.txt"
+  write_concat_list(segment_paths, list_path)
+
+  args = ["-f", "concat", "-safe", "0", "-i", list_path]
+  if audio_path:
+    args += ["-i", audio_path, "-map", "0:v", "-map", "1:a"]
+  args += ["-c", "copy", "-movflags", "+faststart", output_path]
+  try:
+    run_ffmpeg(args)
+  finally:
+    os.remove(list_path)
+
+def mux_segments(
+  segment_paths: List[str],
+  pcm_path: str,
+  output_path: str,
+  sample_rate: int = 44100,
+  audio_codec: str = "aac",
+  audio_bitrate: str = "128k",
+):
+  """Concatena os segmentos de vídeo (stream copy) e codifica a trilha PCM s16le estéreo já mixada."""
+  list_path = output_path + ".concat.txt"
+  write_concat_list(segment_paths, list_path)
+
+  args = [
+    "-f", "concat", "-safe", "0", "-i", list_path,
+    "-f", "s16le", "-ar", str(sample_rate), "-ac", "2", "-i", pcm_path,
+    "-map", "0:v", "-map", "1:a",
+  ]
+  args += ["-c:v", "copy", "-c:a", audio_codec, "-b:a", audio_bitrate, "-ar", str(sample_rate), "-movflags", "+faststart", output_path]
+  try:
+    run_ffmpeg(args)
+  finally:
+    os.remove(list_path)
+
+def split_scale_filter(source: str, sizes: List[Tuple[int, int]]) -> Tuple[str, List[str]]:
+  """filter_complex que recebe o vídeo uma vez e o divide (split) em uma saída escalada por tamanho."""
+  split = f"[{source}]split={len(sizes)}" + "".join(f"[s{i}]" for i in range(len(sizes)))
+  scales = [f"[s{i}]scale={width}:{height}[v{i}]" for i, (width, height) in enumerate(sizes)]
+  return ";".join([split] + scales), [f"[v{i}]" for i in range(len(sizes))]
+
+def transcode_renditions(
+  source_path: str,
+  outputs: List[Tuple[str, Tuple[int, int], str, str]],
+  codec: str = "libx264",
+  preset: str = "medium",
+  audio_codec: str = "aac",
+):
+  """Gera as renditions (caminho, tamanho, bitrate, bitrate do áudio) de um vídeo pronto, decodificando-o uma vez só."""
+  graph, labels = split_scale_filter("0:v", [size for _, size, _, _ in outputs])
+  args = ["-i", source_path, "-filter_complex", graph]
+  for (path, _, bitrate, audio_bitrate), label in zip(outputs, labels):
+    args += [
+      "-map", label, "-map", "0:a?", "-c:v", codec, "-pix_fmt", "yuv420p", "-preset", preset, "-b:v", bitrate,
+      "-c:a", audio_codec, "-b:a", audio_bitrate, "-movflags", "+faststart", path,
+    ]
+  run_ffmpeg(args)
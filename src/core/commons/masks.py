@@ -1,11 +1,23 @@
 import numpy as np
+from functools import lru_cache
 from moviepy import ImageClip
 from PIL import Image, ImageDraw
 
-def rounded_mask(size, radius):
+@lru_cache(maxsize=128)
+def rounded_mask_array(size, radius):
+    # float32 basta para a máscara (0-1) e ocupa metade do float64; o array é compartilhado, então fica somente leitura
     w, h = size
     mask = Image.new("L", size, 0)
     draw = ImageDraw.Draw(mask)
     draw.rounded_rectangle([(0, 0), (w, h)], radius=radius, fill=255)
-    mask_array = np.array(mask) / 255.0
-    return ImageClip(mask_array, is_mask=True)
+    mask_array = np.asarray(mask, dtype=np.float32) / np.float32(255)
+    mask_array.flags.writeable = False
+    return mask_array
+
+@lru_cache(maxsize=128)
+def rounded_mask_clip(size, radius):
+    return ImageClip(rounded_mask_array(size, radius), is_mask=True)
+
+def rounded_mask(size, radius):
+    """Máscara com cantos arredondados, rasterizada uma vez por (tamanho, raio) e reaproveitada entre clips."""
+    return rounded_mask_clip(tuple(size), radius)
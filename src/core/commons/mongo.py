@@ -4,4 +4,32 @@ from motor.motor_asyncio import AsyncIOMotorClient
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 
 client = AsyncIOMotorClient(MONGO_URI)
-db = client[os.getenv("MONGO_DB", "video_generator")] 
\ No newline at end of file
+db = client[os.getenv("MONGO_DB", "video_generator")] 
+class AsyncCollection:
+  """API assíncrona do motor sobre uma coleção síncrona (pymongo ou mongomock), para rodar os repositórios e o
+  worker sem um Mongo de verdade, ex.: VideoRequestRepository(AsyncCollection(mongomock.MongoClient().db.video_requests)).
+  """
+
+  def __init__(self, collection):
+    self.collection = collection
+
+  def find(self, *args, **kwargs):
+    return AsyncCursor(self.collection.find(*args, **kwargs))
+
+  def __getattr__(self, name):
+    method = getattr(self.collection, name)
+
+    async def call(*args, **kwargs):
+      return method(*args, **kwargs)
+    return call
+
+class AsyncCursor:
+  def __init__(self, cursor):
+    self.cursor = cursor
+
+  def sort(self, *args, **kwargs):
+    self.cursor = self.cursor.sort(*args, **kwargs)
+    return self
+
+  async def to_list(self, length=None):
+    return list(self.cursor if length is None else self.cursor.limit(length))
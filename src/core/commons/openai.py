@@ -1,8 +1,9 @@
 import os
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import logging
 import openai
 from typing import Callable, Any, List
+import httpx
 import requests
 import tempfile
 from PIL import Image
@@ -10,15 +11,9 @@ from PIL import Image
 logging.basicConfig(level=logging.ERROR)
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def llm(
-    system_prompt: str,
-    user_input: str,
-    validate_response: Callable[[Any], bool],
-    expected_output: str = None,
-    max_retries: int = 3
-) -> Any:
-
+def build_messages(system_prompt: str, user_input: str, expected_output: str = None) -> List[dict]:
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_input},
@@ -27,6 +22,17 @@ def llm(
     if expected_output:
         messages.append({"role": "user", "content": f"Expected Output: {expected_output}"})
 
+    return messages
+
+def llm(
+    system_prompt: str,
+    user_input: str,
+    validate_response: Callable[[Any], bool],
+    expected_output: str = None,
+    max_retries: int = 3
+) -> Any:
+
+    messages = build_messages(system_prompt, user_input, expected_output)
     attempt = 0
 
     while attempt < max_retries:
@@ -52,6 +58,40 @@ def llm(
     return {"error": "Max retries reached. Invalid LLM output."}
 
 
+async def llm_async(
+    system_prompt: str,
+    user_input: str,
+    validate_response: Callable[[Any], bool],
+    expected_output: str = None,
+    max_retries: int = 3
+) -> Any:
+    """Versão assíncrona do `llm`: mesmo contrato, sem prender uma thread durante a chamada."""
+    messages = build_messages(system_prompt, user_input, expected_output)
+    attempt = 0
+
+    while attempt < max_retries:
+        try:
+            response = await async_client.chat.completions.create(
+                model="gpt-4.1",
+                messages=messages
+            )
+            content = response.model_dump()["choices"][0]["message"]["content"]
+
+            if validate_response(content):
+                return content
+            else:
+                logging.warning(f"Validation failed on attempt {attempt + 1}. Retrying...")
+
+        except Exception as e:
+            logging.error(f"Error communicating with OpenAI API: {e}")
+            return {"error": str(e)}
+
+        attempt += 1
+
+    logging.error("Max retries reached. LLM output is invalid.")
+    return {"error": "Max retries reached. Invalid LLM output."}
+
+
 def generate_image_from_text(input_text: str, n: int = 1, size: str = "1024x1024") -> list:
     """
     Generate image(s) from a text prompt using OpenAI's DALL·E 3 API.
@@ -77,6 +117,25 @@ def generate_image_from_text(input_text: str, n: int = 1, size: str = "1024x1024
         return []
 
 
+async def generate_image_from_text_async(input_text: str, n: int = 1, size: str = "1024x1024") -> list:
+    """
+    Async version of `generate_image_from_text`.
+    Returns:
+        list: List of URLs of the generated images.
+    """
+    try:
+        response = await async_client.images.generate(
+            model="dall-e-3",
+            prompt=input_text,
+            n=n,
+            size=size,
+        )
+        return [img.url for img in response.data]
+    except Exception as e:
+        print(f"Error using DALL·E 3: {e}")
+        return []
+
+
 def download_image_from_url(url: str, use_tempfile: bool = True) -> str:
     """
     Downloads an image from a URL and saves it to a temporary file or to 'debug.png'.
@@ -87,13 +146,28 @@ def download_image_from_url(url: str, use_tempfile: bool = True) -> str:
     """
     response = requests.get(url)
     response.raise_for_status()
+    return save_image_content(response.content, use_tempfile)
+
+
+def save_image_content(content: bytes, use_tempfile: bool = True) -> str:
     if use_tempfile:
         suffix = ".png"  # DALL·E images are usually PNG
         with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-            tmp_file.write(response.content)
+            tmp_file.write(content)
             return tmp_file.name
     else:
         debug_path = "debug.png"
         with open(debug_path, "wb") as f:
-            f.write(response.content)
+            f.write(content)
         return debug_path
+
+
+async def download_image_from_url_async(url: str, use_tempfile: bool = True) -> str:
+    """
+    Async version of `download_image_from_url`.
+    Returns the local file path to the downloaded image.
+    """
+    async with httpx.AsyncClient() as http_client:
+        response = await http_client.get(url)
+        response.raise_for_status()
+    return save_image_content(response.content, use_tempfile)
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from moviepy import ImageClip, TextClip
+from core.commons.asset_cache import LRUCache
+
+TEXT_CACHE_MB = int(os.getenv("TEXT_CACHE_MB", "128"))
+# Vazio: cache só em memória. Com diretório, os rasters sobrevivem a restarts e são vistos por outros processos
+TEXT_CACHE_DIR = os.getenv("TEXT_CACHE_DIR", "")
+
+class TextRasterCache:
+  """Rasters RGBA do TextClip, endereçados pelo conteúdo (texto, fonte, tamanho, cores, contorno, caixa, alinhamento).
+
+  Textos repetidos (respostas reaproveitadas, títulos, renders refeitos) não passam de novo pelo layout/raster do PIL.
+  """
+
+  def __init__(self, max_bytes: int = TEXT_CACHE_MB * 1024 * 1024, cache_dir: str = TEXT_CACHE_DIR):
+    self.cache = LRUCache(max_bytes)
+    self.cache_dir = cache_dir
+    if cache_dir:
+      os.makedirs(cache_dir, exist_ok=True)
+
+  def key(self, **kwargs) -> str:
+    font = kwargs.get("font")
+    # A mesma fonte atualizada em disco gera outro raster
+    font_version = os.path.getmtime(font) if font and os.path.exists(font) else None
+    payload = json.dumps({**kwargs, "font_version": font_version}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+  def text_clip(self, **kwargs) -> ImageClip:
+    """Mesmo resultado de TextClip(**kwargs) (sem duration): ImageClip com a máscara vinda do alpha."""
+    key = self.key(**kwargs)
+    rgba = self.cache.get_or_load(key, lambda: self.load(key, kwargs))
+    return ImageClip(rgba, transparent=True)
+
+  def load(self, key: str, kwargs: dict) -> np.ndarray:
+    rgba = self.read_disk(key)
+    if rgba is None:
+      rgba = self.rasterize(kwargs)
+      self.write_disk(key, rgba)
+    rgba.flags.writeable = False
+    return rgba
+
+  def rasterize(self, kwargs: dict) -> np.ndarray:
+    clip = TextClip(**kwargs)
+    if clip.mask is None:
+      return np.dstack([clip.img, np.full(clip.img.shape[:2], 255, dtype=np.uint8)])
+    alpha = np.round(clip.mask.img * 255).astype(np.uint8)
+    return np.dstack([clip.img.astype(np.uint8), alpha])
+
+  def disk_path(self, key: str) -> str:
+    return os.path.join(self.cache_dir, key[:2], key + ".npy")
+
+  def read_disk(self, key: str):
+    if not self.cache_dir:
+      return None
+    path = self.disk_path(key)
+    if not os.path.exists(path):
+      return None
+    try:
+      return np.load(path, allow_pickle=False)
+    except Exception as e:
+      print(f"Raster de texto inválido em {path}, ignorando: {e}")
+      return None
+
+  def write_disk(self, key: str, rgba: np.ndarray):
+    if not self.cache_dir:
+      return
+    path = self.disk_path(key)
+    try:
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+      with os.fdopen(fd, "wb") as f:
+        np.save(f, rgba, allow_pickle=False)
+      os.replace(tmp_path, path)
+    except OSError as e:
+      print(f"Não foi possível gravar o raster de texto em {path}: {e}")
+
+  def stats(self) -> dict:
+    return {**self.cache.stats(), "cache_dir": self.cache_dir or None}
+
+text_cache = TextRasterCache()
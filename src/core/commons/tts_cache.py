@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from typing import Optional
+
+# Vazio desliga o cache: toda síntese vai para o Google TTS e o áudio é gravado num arquivo temporário
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MB = int(os.getenv("TTS_CACHE_MB", "1024"))
+# Subdiretório das cópias dos jobs: fora do LRU e da contagem de bytes
+JOBS_DIR = "jobs"
+
+class TTSCache:
+  """Áudios do TTS em disco, endereçados pelo hash do pedido (texto/SSML, voz, idioma, velocidade, encoding).
+
+  Um hit não abre conexão com o Google. O LRU usa o mtime dos arquivos (renovado a cada hit), então vale
+  entre processos e restarts; passando de max_bytes, os menos usados recentemente são apagados.
+  """
+
+  def __init__(self, cache_dir: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MB * 1024 * 1024):
+    self.cache_dir = cache_dir
+    self.max_bytes = max_bytes
+    self.lock = threading.Lock()
+    # Tamanho em disco, medido na primeira escrita e mantido a cada put
+    self.bytes = None
+    self.hits = 0
+    self.misses = 0
+    self.writes = 0
+    self.evictions = 0
+
+  @property
+  def enabled(self) -> bool:
+    return bool(self.cache_dir)
+
+  def key(self, **fields) -> str:
+    payload = json.dumps(fields, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+  def path(self, key: str, suffix: str = ".mp3") -> str:
+    return os.path.join(self.cache_dir, key[:2], key + suffix)
+
+  def get(self, key: str, suffix: str = ".mp3") -> Optional[str]:
+    """Caminho do áudio em cache (e renova o uso dele), ou None."""
+    if not self.enabled:
+      return None
+    path = self.path(key, suffix)
+    try:
+      os.utime(path)
+    except FileNotFoundError:
+      with self.lock:
+        self.misses += 1
+      return None
+    except OSError:
+      # Diretório só leitura: o arquivo serve, só o LRU não é renovado
+      if not os.path.exists(path):
+        with self.lock:
+          self.misses += 1
+        return None
+    with self.lock:
+      self.hits += 1
+    return path
+
+  def read(self, key: str, suffix: str = ".mp3") -> Optional[bytes]:
+    path = self.get(key, suffix)
+    if path is None:
+      return None
+    try:
+      with open(path, "rb") as f:
+        return f.read()
+    except FileNotFoundError:
+      # Apagado por outro processo entre o get e o open
+      return None
+
+  def job_copy(self, path: str) -> Optional[str]:
+    """Hardlink do áudio em cache para um job: a eviction (deste ou de outro processo) pode apagar o original
+    enquanto o job ainda o lê. O job apaga a cópia quando termina. None se o original já foi apagado."""
+    suffix = os.path.splitext(path)[1]
+    job_path = os.path.join(self.cache_dir, JOBS_DIR, uuid.uuid4().hex + suffix)
+    try:
+      os.makedirs(os.path.dirname(job_path), exist_ok=True)
+      os.link(path, job_path)
+      return job_path
+    except FileNotFoundError:
+      # Apagado por outro processo entre o get e o link
+      return None
+    except OSError:
+      # Sem hardlink (ou diretório só leitura): cópia num temporário
+      fd, job_path = tempfile.mkstemp(suffix=suffix)
+      try:
+        with os.fdopen(fd, "wb") as out, open(path, "rb") as f:
+          shutil.copyfileobj(f, out)
+      except FileNotFoundError:
+        os.remove(job_path)
+        return None
+      return job_path
+
+  def put(self, key: str, content: bytes, suffix: str = ".mp3") -> Optional[str]:
+    """Grava o áudio de forma atômica (temp + rename) e retorna o caminho; None se o cache estiver desligado ou falhar."""
+    if not self.enabled:
+      return None
+    path = self.path(key, suffix)
+    directory = os.path.dirname(path)
+    try:
+      os.makedirs(directory, exist_ok=True)
+      fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+      try:
+        with os.fdopen(fd, "wb") as f:
+          f.write(content)
+        os.replace(tmp_path, path)
+      except Exception:
+        if os.path.exists(tmp_path):
+          os.remove(tmp_path)
+        raise
+    except OSError as e:
+      print(f"Não foi possível gravar o áudio do TTS em {path}: {e}")
+      return None
+
+    with self.lock:
+      self.writes += 1
+      if self.bytes is None:
+        self.bytes = self.disk_usage()[0]
+      else:
+        self.bytes += len(content)
+      if self.bytes > self.max_bytes:
+        self.evict(keep=path)
+    return path
+
+  def entries(self):
+    """(mtime, tamanho, caminho) de cada áudio em disco."""
+    for root, dirs, files in os.walk(self.cache_dir):
+      if root == self.cache_dir and JOBS_DIR in dirs:
+        dirs.remove(JOBS_DIR)
+      for name in files:
+        if name.endswith(".tmp"):
+          continue
+        path = os.path.join(root, name)
+        try:
+          stat = os.stat(path)
+        except FileNotFoundError:
+          continue
+        yield stat.st_mtime, stat.st_size, path
+
+  def disk_usage(self):
+    total, files = 0, 0
+    for _, size, _ in self.entries():
+      total += size
+      files += 1
+    return total, files
+
+  def evict(self, keep: str = None):
+    # Relê o diretório: outros processos também gravam e apagam
+    entries = sorted(self.entries())
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+      if total <= self.max_bytes:
+        break
+      if path == keep:
+        continue
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+      total -= size
+      self.evictions += 1
+    self.bytes = total
+
+  def stats(self) -> dict:
+    total, files = self.disk_usage() if self.enabled else (0, 0)
+    with self.lock:
+      lookups = self.hits + self.misses
+      return {
+        "cache_dir": self.cache_dir or None,
+        "hits": self.hits,
+        "misses": self.misses,
+        "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        "writes": self.writes,
+        "evictions": self.evictions,
+        "files": files,
+        "bytes": total,
+        "max_bytes": self.max_bytes,
+      }
+
+tts_cache = TTSCache()
@@ -1,19 +1,38 @@
-import tempfile
-from core.domain.pipeline import Step
-from core.commons.audio_processor import generate_tts
+import asyncio
+from core.domain.cancellation import track_temp_file
+from core.domain.checkpoint_store import checkpoint_store
+from core.domain.pipeline import Step, step_executor
+from core.commons.audio_processor import generate_tts_file, generate_tts_file_async
 from moviepy.audio.io.AudioFileClip import AudioFileClip
 
 class GenerateSpeechStep(Step):
+    checkpointable = True
+
     def __init__(self, name, description, input_transformer=None):
         super().__init__(name, description, input_transformer)
 
     def execute(self, input: dict, context: dict):
-        audio_content = generate_tts(input["text_ssml"])
+        self.store_audio(generate_tts_file(input["text_ssml"]), context)
+
+    async def execute_async(self, input: dict, context: dict):
+        audio_path = await generate_tts_file_async(input["text_ssml"])
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(step_executor, self.store_audio, audio_path, context)
+
+    def store_audio(self, audio_path: str, context: dict):
+        # Cópia do job (hardlink do cache ou temporário): apagada quando o job termina
+        track_temp_file(context, audio_path)
+
+        self.load_audio(audio_path, context)
+
+    def checkpoint(self, input: dict, context: dict):
+        audio_path = context[self.name]["audio_path"]
+        return {"audio_path": checkpoint_store.save_file(context["id"], self.checkpoint_key(context), audio_path)}
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as f:
-            f.write(audio_content)
-            audio_path = f.name
+    def restore(self, payload, input: dict, context: dict):
+        self.load_audio(payload["audio_path"], context)
 
+    def load_audio(self, audio_path: str, context: dict):
         audio_clip = AudioFileClip(audio_path)
 
         context[self.name] = {
@@ -0,0 +1,113 @@
+import os
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from moviepy import AudioFileClip
+from moviepy.audio.AudioClip import AudioArrayClip, CompositeAudioClip
+from core.commons.asset_cache import asset_cache
+
+AUDIO_MIX_FPS = 44100
+# Ganho da música enquanto há narração (1.0 desliga o ducking)
+MUSIC_DUCK_GAIN = float(os.getenv("MUSIC_DUCK_GAIN", "1.0"))
+
+class AudioMixer:
+  """Mixa a trilha do vídeo inteiro num único buffer float32 (amostras x canais), com NumPy vetorizado.
+
+  Cada fonte é decodificada uma vez; as árvores de CompositeAudioClip viram (amostras, offset) somados no buffer,
+  com a mesma regra do moviepy: cada clip toca de start até start + duração.
+  """
+
+  def __init__(self, fps: int = AUDIO_MIX_FPS, nchannels: int = 2):
+    self.fps = fps
+    self.nchannels = nchannels
+    # (amostras, offset em amostras, ganho)
+    self.tracks: List[Tuple[np.ndarray, int, float]] = []
+    self.decoded: Dict[int, np.ndarray] = {}
+
+  def to_channels(self, samples: np.ndarray) -> np.ndarray:
+    samples = np.asarray(samples, dtype=np.float32)
+    if samples.ndim == 1:
+      samples = samples.reshape(-1, 1)
+    if samples.shape[1] == self.nchannels:
+      return samples
+    if samples.shape[1] == 1:
+      return np.repeat(samples, self.nchannels, axis=1)
+    return samples[:, :self.nchannels]
+
+  def decode(self, clip) -> np.ndarray:
+    # O mesmo clip pode aparecer em mais de um ponto da timeline
+    if id(clip) not in self.decoded:
+      if isinstance(clip, AudioArrayClip) and clip.fps == self.fps:
+        samples = clip.array
+      else:
+        samples = clip.to_soundarray(fps=self.fps)
+      self.decoded[id(clip)] = self.to_channels(samples)
+    return self.decoded[id(clip)]
+
+  def add(self, samples: np.ndarray, offset: float = 0.0, gain: float = 1.0):
+    self.tracks.append((self.to_channels(samples), int(round(offset * self.fps)), gain))
+
+  def add_clip(self, clip, offset: float = 0.0, gain: float = 1.0, limit: Optional[float] = None):
+    """Adiciona um AudioClip; composites são achatados até as fontes.
+
+    limit: fim, no tempo da mixagem, do composite pai (ex.: um composite encurtado com with_duration);
+    nenhum filho toca além dele.
+    """
+    start = offset + (clip.start or 0.0)
+    end = start + clip.duration if clip.duration is not None else None
+    if limit is not None:
+      end = limit if end is None else min(end, limit)
+    if end is not None and end <= start:
+      return
+    if isinstance(clip, CompositeAudioClip):
+      for child in clip.clips:
+        self.add_clip(child, start, gain, end)
+      return
+    samples = self.decode(clip)
+    if end is not None:
+      samples = samples[:int(round((end - start) * self.fps))]
+    self.tracks.append((samples, int(round(start * self.fps)), gain))
+
+  def render(self, duration: float, music: Optional[np.ndarray] = None, music_gain: float = 1.0, duck_gain: float = MUSIC_DUCK_GAIN) -> np.ndarray:
+    """Soma as trilhas num buffer pré-alocado de `duration`; a música (se houver) é repetida até o fim e abaixada sob a voz."""
+    n_samples = int(round(duration * self.fps))
+    buffer = np.zeros((n_samples, self.nchannels), dtype=np.float32)
+    for samples, offset, gain in self.tracks:
+      if offset >= n_samples:
+        continue
+      chunk = samples[:n_samples - offset]
+      if gain == 1.0:
+        buffer[offset:offset + len(chunk)] += chunk
+      else:
+        buffer[offset:offset + len(chunk)] += chunk * np.float32(gain)
+
+    if music is not None and len(music):
+      music = self.to_channels(music)
+      reps = -(-n_samples // len(music))
+      looped = np.tile(music, (reps, 1))[:n_samples] * np.float32(music_gain)
+      if duck_gain < 1.0:
+        looped *= self.duck_envelope(buffer, duck_gain)[:, None]
+      buffer += looped
+    return buffer
+
+  def duck_envelope(self, voice: np.ndarray, duck_gain: float, window: float = 0.05, threshold: float = 0.02, ramp: float = 0.2) -> np.ndarray:
+    """Ganho por amostra: duck_gain onde a voz passa do threshold (RMS em janelas), com rampa suave nas transições."""
+    size = max(1, int(window * self.fps))
+    n_windows = -(-len(voice) // size)
+    padded = np.zeros((n_windows * size, voice.shape[1]), dtype=np.float32)
+    padded[:len(voice)] = voice
+    rms = np.sqrt((padded.reshape(n_windows, -1) ** 2).mean(axis=1))
+    gains = np.where(rms > threshold, duck_gain, 1.0).astype(np.float32)
+    ramp_windows = max(1, int(ramp / window))
+    gains = np.convolve(gains, np.ones(ramp_windows, dtype=np.float32) / ramp_windows, mode="same")
+    return np.repeat(gains, size)[:len(voice)]
+
+def load_music(path: str, fps: int = AUDIO_MIX_FPS) -> np.ndarray:
+  """PCM da música: do cache de assets quando a taxa já bate com a da mixagem."""
+  samples, source_fps = asset_cache.audio_samples(path)
+  if source_fps == fps:
+    return samples
+  clip = AudioFileClip(path)
+  try:
+    return clip.to_soundarray(fps=fps)
+  finally:
+    clip.close()
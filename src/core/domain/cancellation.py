@@ -0,0 +1,107 @@
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+class PipelineCancelled(Exception):
+  pass
+
+class CancellationToken:
+  """Sinal de cancelamento checado cooperativamente pela pipeline (entre steps, itens e frames do export).
+
+  Os callbacks de on_cancel servem para interromper o que não passa por esses pontos (ex.: o processo do ffmpeg).
+  """
+
+  def __init__(self):
+    self.event = threading.Event()
+    self.lock = threading.Lock()
+    self.callbacks: List[Callable[[], None]] = []
+    self.temp_files: List[str] = []
+
+  @property
+  def cancelled(self) -> bool:
+    return self.event.is_set()
+
+  def cancel(self):
+    with self.lock:
+      if self.event.is_set():
+        return
+      self.event.set()
+      callbacks = list(self.callbacks)
+    for callback in callbacks:
+      try:
+        callback()
+      except Exception as e:
+        print(f"Erro no callback de cancelamento: {e}")
+
+  def raise_if_cancelled(self):
+    if self.event.is_set():
+      raise PipelineCancelled("Pipeline cancelled")
+
+  def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+    """Registra o callback (ou chama na hora, se já cancelado) e retorna a função que o remove."""
+    with self.lock:
+      if not self.event.is_set():
+        self.callbacks.append(callback)
+        return lambda: self.remove_callback(callback)
+    callback()
+    return lambda: None
+
+  def remove_callback(self, callback: Callable[[], None]):
+    with self.lock:
+      if callback in self.callbacks:
+        self.callbacks.remove(callback)
+
+  def track_file(self, path: str):
+    with self.lock:
+      self.temp_files.append(path)
+
+  def cleanup(self):
+    """Apaga os arquivos temporários do job (no fim do job ou no cancelamento)."""
+    with self.lock:
+      paths, self.temp_files = self.temp_files, []
+    for path in paths:
+      try:
+        if os.path.exists(path):
+          os.remove(path)
+      except OSError as e:
+        print(f"Não foi possível remover {path}: {e}")
+
+def raise_if_cancelled(context: dict):
+  token = context.get("cancel_token")
+  if token:
+    token.raise_if_cancelled()
+
+def track_temp_file(context: dict, path: str):
+  token = context.get("cancel_token")
+  if token:
+    token.track_file(path)
+
+class CancellationRegistry:
+  """Tokens dos jobs rodando neste processo, por id do vídeo."""
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.tokens: Dict[str, CancellationToken] = {}
+
+  def create(self, video_id: str) -> CancellationToken:
+    token = CancellationToken()
+    with self.lock:
+      self.tokens[video_id] = token
+    return token
+
+  def get(self, video_id: str) -> Optional[CancellationToken]:
+    with self.lock:
+      return self.tokens.get(video_id)
+
+  def cancel(self, video_id: str) -> bool:
+    token = self.get(video_id)
+    if token is None:
+      return False
+    token.cancel()
+    return True
+
+  def remove(self, video_id: str):
+    with self.lock:
+      self.tokens.pop(video_id, None)
+
+cancellation_registry = CancellationRegistry()
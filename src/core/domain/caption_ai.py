@@ -1,14 +1,18 @@
 import ast
+import asyncio
 import os
-import tempfile
-from moviepy import AudioFileClip, CompositeVideoClip, TextClip, VideoClip, concatenate_videoclips, ColorClip
+from moviepy import AudioFileClip, CompositeVideoClip, VideoClip, concatenate_videoclips, ColorClip
 from core.commons.masks import rounded_mask
-from core.commons.openai import llm
-from core.commons.audio_processor import generate_tts
+from core.commons.text_cache import text_cache
+from core.commons.openai import llm, llm_async
+from core.commons.audio_processor import generate_tts_file, generate_tts_file_async
 from core.commons.font import get_valid_font_path
-from core.domain.pipeline import Step
+from core.domain.cancellation import track_temp_file
+from core.domain.checkpoint_store import checkpoint_store
+from core.domain.pipeline import Step, step_executor
 from typing import Callable, Optional
 from dataclasses import dataclass
+from functools import lru_cache
 
 @dataclass
 class BackgroundConfig:
@@ -41,7 +45,7 @@ class GenerateCaptionWithSpeechInput(GenerateCaptionInput):
 
 class GenerateCaptionStep(Step):
   def format_text_clip(self, text: str, duration: float, input: GenerateCaptionInput):
-    text_clip = TextClip(
+    text_clip = text_cache.text_clip(
       text="".join(text) if isinstance(text, list) else text,
       font_size=input.font_size,
       color=input.color,
@@ -62,25 +66,27 @@ class GenerateCaptionStep(Step):
       blink_interval = 0.25
 
       if input.effect == "blink_opacity":
-        # Define how opacity changes with time
-        def get_opacity_at_time(t):
-          # Duration of one full cycle down and up
-          steps = int((base_opacity - blink_min) / blink_step)
-          total_cycle_time = blink_interval * steps * 2
+        # A opacidade desce e sobe em degraus de blink_step: só existem 2 * steps frames diferentes
+        steps = int((base_opacity - blink_min) / blink_step)
+        opacities = [base_opacity - (k * blink_step) for k in range(steps)] + [blink_min + (k * blink_step) for k in range(steps)]
+        total_cycle_time = blink_interval * steps * 2
+        half_cycle = blink_interval * steps
+
+        def phase_at_time(t):
+          if steps == 0:
+            return None
           t = t % total_cycle_time  # loop the effect
-          half_cycle = blink_interval * steps
-
           if t < half_cycle:
-            return base_opacity - (int(t / blink_interval) * blink_step)
+            phase = int(t / blink_interval)
           else:
-            return blink_min + (int((t - half_cycle) / blink_interval) * blink_step)
+            phase = steps + int((t - half_cycle) / blink_interval)
+          return min(phase, len(opacities) - 1)
 
-        # Use make_frame to vary opacity
         def frame_function(t):
-          opacity = get_opacity_at_time(t)
-          clip = ColorClip(size=(w+30, h+30), color=rgb).with_duration(duration)
-          frame = clip.get_frame(t)
-          return (frame * opacity).astype("uint8")
+          phase = phase_at_time(t)
+          # Sem degraus (opacidade base <= mínima do blink) o fundo fica fixo na opacidade base
+          opacity = base_opacity if phase is None else opacities[phase]
+          return blink_frame((w + 30, h + 30), tuple(rgb), opacity)
 
         bg = VideoClip(frame_function=frame_function, duration=duration)
         mask_array = rounded_mask((w + 30, h + 30), radius=40)
@@ -101,13 +107,26 @@ class GenerateCaptionStep(Step):
     }
 
 class GenerateCaptionWithSpeechStep(GenerateCaptionStep):
+  checkpointable = True
+
   def __init__(self, name: str, description: str, input_transformer: Callable[[dict], dict] = None):
     super().__init__(name, description, input_transformer)
 
   def execute(self, input: GenerateCaptionWithSpeechInput, context: dict):
     blocks, ssml_text = self.generate_caption_blocks_and_ssml(input)
-
-    full_audio = self.generate_audio_clip(ssml_text)
+    audio_path = generate_tts_file(ssml_text, ssml=True)
+    track_temp_file(context, audio_path)
+    self.build_typing(blocks, audio_path, input, context)
+
+  async def execute_async(self, input: GenerateCaptionWithSpeechInput, context: dict):
+    blocks, ssml_text = await self.generate_caption_blocks_and_ssml_async(input)
+    audio_path = await generate_tts_file_async(ssml_text, ssml=True)
+    track_temp_file(context, audio_path)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(step_executor, self.build_typing, blocks, audio_path, input, context)
+
+  def build_typing(self, blocks: list, audio_path: str, input: GenerateCaptionWithSpeechInput, context: dict):
+    full_audio = AudioFileClip(audio_path)
     audio_duration = full_audio.duration
 
     total_chars = sum(len(block) for block in blocks)
@@ -127,18 +146,44 @@ class GenerateCaptionWithSpeechStep(GenerateCaptionStep):
       "typing_clip": typing_clip,
       "audio_clip": full_audio,
       "duration": audio_duration,
+      "blocks": blocks,
+      "audio_path": audio_path,
     }
 
-  
+  def checkpoint(self, input: GenerateCaptionWithSpeechInput, context: dict):
+    output = context[self.name]
+    return {
+      "blocks": output["blocks"],
+      "audio_path": checkpoint_store.save_file(context["id"], self.checkpoint_key(context), output["audio_path"]),
+    }
 
-  def generate_audio_clip(self, ssml_text: str):
-    audio_content = generate_tts(ssml_text, ssml=True)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as f:
-      f.write(audio_content)
-      audio_path = f.name
-    return AudioFileClip(audio_path)
+  def restore(self, payload, input: GenerateCaptionWithSpeechInput, context: dict):
+    # Só a parte paga (LLM + TTS) vem do checkpoint; os clips são remontados
+    self.build_typing(payload["blocks"], payload["audio_path"], input, context)
 
   def generate_caption_blocks_and_ssml(self, input_data, expected_output=None):
+    system_prompt, user_input, validate_response = self.caption_prompt(input_data)
+    raw_blocks_and_ssml = llm(
+      system_prompt=system_prompt,
+      user_input=user_input,
+      validate_response=validate_response,
+      expected_output=expected_output,
+      max_retries=3
+    )
+    return self.parse_caption_output(raw_blocks_and_ssml)
+
+  async def generate_caption_blocks_and_ssml_async(self, input_data, expected_output=None):
+    system_prompt, user_input, validate_response = self.caption_prompt(input_data)
+    raw_blocks_and_ssml = await llm_async(
+      system_prompt=system_prompt,
+      user_input=user_input,
+      validate_response=validate_response,
+      expected_output=expected_output,
+      max_retries=3
+    )
+    return self.parse_caption_output(raw_blocks_and_ssml)
+
+  def caption_prompt(self, input_data):
     system_prompt = (
       "You are responsible for splitting a long text into multiple blocks for on-screen display AND generating the corresponding SSML text for speech synthesis. Follow these rules carefully:\n"
       "- Return a JSON object with two fields: 'blocks' and 'ssml'.\n"
@@ -176,20 +221,22 @@ class GenerateCaptionWithSpeechStep(GenerateCaptionStep):
       except Exception:
         return False
 
-    raw_blocks_and_ssml = llm(
-      system_prompt=system_prompt,
-      user_input=user_input,
-      validate_response=validate_response,
-      expected_output=expected_output,
-      max_retries=3
-    )
+    return system_prompt, user_input, validate_response
 
+  def parse_caption_output(self, raw_blocks_and_ssml):
     if isinstance(raw_blocks_and_ssml, dict) and "error" in raw_blocks_and_ssml:
       raise ValueError(f"Failed to generate caption blocks and SSML: {raw_blocks_and_ssml['error']}")
 
     parsed_output = ast.literal_eval(raw_blocks_and_ssml)
     return [" ".join(lines) for lines in parsed_output["blocks"]], parsed_output["ssml"]
 
+@lru_cache(maxsize=256)
+def blink_frame(size, rgb, opacity):
+  """Frame do fundo da legenda numa opacidade do blink, compartilhado entre os blocos (mesmo tamanho e cor)."""
+  frame = (ColorClip(size=size, color=rgb).get_frame(0) * opacity).astype("uint8")
+  frame.flags.writeable = False
+  return frame
+
 # Suporte simples de conversão de cor
 def parse_color(color: str):
   return color;
@@ -0,0 +1,113 @@
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import time
+from typing import Any, Iterable, Optional
+
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "checkpoints")
+# Retenção: checkpoints sem escrita há mais de CHECKPOINT_TTL_HOURS são apagados e, passando de
+# CHECKPOINT_MAX_MB, os vídeos escritos há mais tempo saem primeiro (0 desliga cada limite)
+CHECKPOINT_TTL_HOURS = float(os.getenv("CHECKPOINT_TTL_HOURS", "168"))
+CHECKPOINT_MAX_MB = int(os.getenv("CHECKPOINT_MAX_MB", "2048"))
+
+class CheckpointStore:
+  """Persiste a saída dos steps em disco, por vídeo e caminho do step (ex.: create_questions[2]/generate_question_typing)."""
+
+  def __init__(self, base_path: str = CHECKPOINT_PATH, ttl_hours: float = CHECKPOINT_TTL_HOURS, max_bytes: int = CHECKPOINT_MAX_MB * 1024 * 1024):
+    self.base_path = base_path
+    self.ttl_hours = ttl_hours
+    self.max_bytes = max_bytes
+
+  def video_dir(self, video_id: str) -> str:
+    return os.path.join(self.base_path, video_id)
+
+  def file_path(self, video_id: str, step_path: str, suffix: str = ".pkl") -> str:
+    safe_name = re.sub(r"[^A-Za-z0-9_.\[\]-]", "__", step_path)
+    return os.path.join(self.video_dir(video_id), safe_name + suffix)
+
+  def load(self, video_id: str, step_path: str) -> Optional[Any]:
+    path = self.file_path(video_id, step_path)
+    if not os.path.exists(path):
+      return None
+    try:
+      with open(path, "rb") as f:
+        return pickle.load(f)
+    except Exception as e:
+      print(f"Checkpoint inválido em {path}, ignorando: {e}")
+      return None
+
+  def save(self, video_id: str, step_path: str, payload: Any) -> bool:
+    try:
+      data = pickle.dumps(payload)
+    except Exception as e:
+      print(f"Saída do step {step_path} não serializável, sem checkpoint: {e}")
+      return False
+    self.write_atomic(self.file_path(video_id, step_path), data)
+    return True
+
+  def save_file(self, video_id: str, step_path: str, source_path: str) -> str:
+    """Copia um arquivo gerado pelo step (áudio, imagem) para junto do checkpoint e retorna o novo caminho."""
+    suffix = os.path.splitext(source_path)[1] or ".bin"
+    target = self.file_path(video_id, step_path, suffix)
+    with open(source_path, "rb") as f:
+      self.write_atomic(target, f.read())
+    return target
+
+  def write_atomic(self, path: str, data: bytes):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+      with os.fdopen(fd, "wb") as f:
+        f.write(data)
+      os.replace(tmp_path, path)
+    except Exception:
+      if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+      raise
+
+  def exists(self, video_id: str) -> bool:
+    return os.path.isdir(self.video_dir(video_id))
+
+  def clear(self, video_id: str):
+    shutil.rmtree(self.video_dir(video_id), ignore_errors=True)
+
+  def entries(self):
+    """(última escrita, tamanho, video_id) de cada vídeo com checkpoints; o mtime do diretório muda a cada save."""
+    try:
+      names = os.listdir(self.base_path)
+    except FileNotFoundError:
+      return
+    for video_id in names:
+      directory = self.video_dir(video_id)
+      try:
+        mtime = os.stat(directory).st_mtime
+        size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+      except (FileNotFoundError, NotADirectoryError):
+        # Apagado por outro processo ou arquivo solto na raiz
+        continue
+      yield mtime, size, video_id
+
+  def prune(self, keep: Iterable[str] = ()) -> int:
+    """Apaga os checkpoints vencidos pelo TTL e, acima de max_bytes, os dos vídeos escritos há mais tempo.
+
+    keep: vídeos na fila ou renderizando, que nunca perdem os checkpoints. Retorna quantos vídeos foram apagados.
+    """
+    keep = set(keep)
+    now = time.time()
+    entries = sorted(self.entries())
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, video_id in entries:
+      expired = self.ttl_hours > 0 and now - mtime > self.ttl_hours * 3600
+      over_limit = self.max_bytes > 0 and total > self.max_bytes
+      if video_id in keep or not (expired or over_limit):
+        continue
+      self.clear(video_id)
+      total -= size
+      removed += 1
+    return removed
+
+checkpoint_store = CheckpointStore()
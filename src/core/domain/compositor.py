@@ -0,0 +1,107 @@
+import os
+import threading
+import numpy as np
+from moviepy import CompositeVideoClip
+from moviepy.tools import compute_position
+
+# moviepy: composição padrão (Pillow, RGBA em tela cheia por camada) | numpy: blend uint8 in-place só na área de cada camada
+CANVAS_COMPOSITOR = os.getenv("CANVAS_COMPOSITOR", "moviepy")
+COMPOSITORS = ("moviepy", "numpy")
+
+class NumpyCompositeClip(CompositeVideoClip):
+  """CompositeVideoClip que cola as camadas direto num frame uint8, tocando só o retângulo de cada camada.
+
+  Vale para o caso dos canvas: fundo opaco (use_bgclip, sem máscara) e saída RGB. Fora disso usa a composição
+  do moviepy. Alpha: (src * a + dst * (255 - a)) / 255 em uint16, com buffers de trabalho reaproveitados por thread.
+
+  O frame retornado é um buffer da thread, sobrescrito no próximo get_frame deste clip na mesma thread:
+  quem guarda o frame (ex.: o last_frame dos canvas) precisa copiá-lo.
+  """
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.scratch = threading.local()
+
+  def frame_function(self, t):
+    if self.is_mask or self.created_bg or self.bg.mask is not None:
+      return CompositeVideoClip.frame_function(self, t)
+
+    bg = self.bg.get_frame(t - self.bg.start)
+    frame = self.output(bg.shape)
+    np.copyto(frame, bg, casting="unsafe")
+    height, width = frame.shape[:2]
+    for clip in self.playing_clips(t):
+      ct = t - clip.start
+      src = clip.get_frame(ct)
+      if src.dtype != np.uint8:
+        src = src.astype(np.uint8)
+      alpha = None
+      if clip.mask is not None:
+        # Arredonda (o moviepy trunca): máscara 0.5 vira 128, não 127
+        alpha = (clip.mask.get_frame(ct) * 255 + 0.5).astype(np.uint8)
+        alpha = fit_mask(alpha, src.shape[:2])
+
+      x, y = compute_position((src.shape[1], src.shape[0]), (width, height), clip.pos(ct), clip.relative_pos)
+      # Recorta a camada na área visível do frame
+      x0, y0 = max(x, 0), max(y, 0)
+      x1, y1 = min(x + src.shape[1], width), min(y + src.shape[0], height)
+      if x1 <= x0 or y1 <= y0:
+        continue
+      src = src[y0 - y:y1 - y, x0 - x:x1 - x, :3]
+      dst = frame[y0:y1, x0:x1]
+      if alpha is None:
+        dst[...] = src
+      else:
+        self.blend(dst, src, alpha[y0 - y:y1 - y, x0 - x:x1 - x])
+    return frame
+
+  def blend(self, dst: np.ndarray, src: np.ndarray, alpha: np.ndarray):
+    """dst = (src * a + dst * (255 - a)) / 255, arredondado, gravado in-place em dst."""
+    work, rest = self.buffers(dst.shape)
+    a = alpha[:, :, None]
+    np.multiply(src, a, out=work, dtype=np.uint16)
+    np.multiply(dst, 255 - a, out=rest, dtype=np.uint16)
+    work += rest
+    # Divisão por 255 com arredondamento sem float: (x + 128 + ((x + 128) >> 8)) >> 8
+    work += 128
+    np.right_shift(work, 8, out=rest)
+    work += rest
+    work >>= 8
+    np.copyto(dst, work, casting="unsafe")
+
+  def output(self, shape) -> np.ndarray:
+    frame = getattr(self.scratch, "frame", None)
+    if frame is None or frame.shape != shape:
+      frame = np.empty(shape, dtype=np.uint8)
+      self.scratch.frame = frame
+    return frame
+
+  def buffers(self, shape):
+    cached = getattr(self.scratch, "buffers", None)
+    if cached is None or cached[0].shape[0] < shape[0] or cached[0].shape[1] < shape[1]:
+      size = (max(shape[0], cached[0].shape[0] if cached else 0), max(shape[1], cached[0].shape[1] if cached else 0), 3)
+      cached = (np.empty(size, dtype=np.uint16), np.empty(size, dtype=np.uint16))
+      self.scratch.buffers = cached
+    work, rest = cached
+    return work[:shape[0], :shape[1]], rest[:shape[0], :shape[1]]
+
+  def __copy__(self):
+    # Cópias (with_duration, with_position...) não dividem os buffers entre threads
+    clip = super().__copy__()
+    clip.scratch = threading.local()
+    return clip
+
+def fit_mask(alpha: np.ndarray, shape) -> np.ndarray:
+  # Mesma regra do compose_on do moviepy: máscara maior é cortada, menor é completada com 0 (canto superior esquerdo)
+  if alpha.shape == shape:
+    return alpha
+  fitted = np.zeros(shape, dtype=np.uint8)
+  h, w = min(shape[0], alpha.shape[0]), min(shape[1], alpha.shape[1])
+  fitted[:h, :w] = alpha[:h, :w]
+  return fitted
+
+def composite_class(compositor: str = None):
+  compositor = compositor or CANVAS_COMPOSITOR
+  if compositor not in COMPOSITORS:
+    raise ValueError(f"Unknown compositor '{compositor}'. Use one of {COMPOSITORS}.")
+  return NumpyCompositeClip if compositor == "numpy" else CompositeVideoClip
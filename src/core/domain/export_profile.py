@@ -0,0 +1,84 @@
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from core.domain.static_spans import hold_static_frames
+
+# Encoder do perfil standard; vazio usa o padrão do ffmpeg/libx264
+EXPORT_PRESET = os.getenv("EXPORT_PRESET", "medium")
+EXPORT_CRF = os.getenv("EXPORT_CRF", "")
+EXPORT_THREADS = os.getenv("EXPORT_THREADS", "")
+# Perfil dos pedidos que não escolhem um
+EXPORT_PROFILE = os.getenv("EXPORT_PROFILE", "standard")
+# Renditions gravadas junto do {id}.mp4 quando o pedido não escolhe (ex.: "720p,480p"); vazio grava só o principal
+EXPORT_RENDITIONS = [name.strip() for name in os.getenv("EXPORT_RENDITIONS", "").split(",") if name.strip()]
+
+@dataclass(frozen=True)
+class ExportProfile:
+  """Resolução (escala sobre o canvas 1080x1920), fps e encoder de um export."""
+  name: str
+  scale: float = 1.0
+  fps: float = 10
+  preset: Optional[str] = EXPORT_PRESET
+  crf: Optional[str] = EXPORT_CRF
+  audio_bitrate: str = "128k"
+
+  def output_size(self, size) -> Tuple[int, int]:
+    # yuv420p exige largura e altura pares
+    width, height = size
+    return max(2, round(width * self.scale / 2) * 2), max(2, round(height * self.scale / 2) * 2)
+
+  def video_params(self) -> list:
+    """Parâmetros extras de saída do ffmpeg (crf), para os writers do moviepy."""
+    return ["-crf", str(self.crf)] if self.crf else []
+
+  def export_clip(self, clip):
+    """Clip que vai para o encoder: reduzido para a escala do perfil antes da geração dos frames
+    (composição, pipe e encoder já trabalham no tamanho de saída) e com os trechos estáticos reaproveitados."""
+    source = clip
+    if self.scale != 1.0:
+      clip = clip.resized(self.output_size(clip.size))
+    return hold_static_frames(clip, source=source)
+
+EXPORT_PROFILES = {
+  # Prévia para aprovar o conteúdo: metade da resolução, metade dos frames e o preset mais rápido
+  "draft": ExportProfile("draft", scale=0.5, fps=5, preset="ultrafast", crf="28", audio_bitrate="96k"),
+  "standard": ExportProfile("standard"),
+  "high": ExportProfile("high", preset="slow", crf="18", audio_bitrate="192k"),
+}
+
+def export_profile(name: str = None) -> ExportProfile:
+  name = name or EXPORT_PROFILE
+  if name not in EXPORT_PROFILES:
+    raise ValueError(f"Unknown export profile '{name}'. Use one of {tuple(EXPORT_PROFILES)}.")
+  return EXPORT_PROFILES[name]
+
+@dataclass(frozen=True)
+class Rendition:
+  """Cópia do vídeo num tamanho e bitrate fixos, tirada dos mesmos frames do export principal."""
+  name: str
+  width: int
+  height: int
+  bitrate: str
+  audio_bitrate: str = "128k"
+
+  @property
+  def size(self) -> Tuple[int, int]:
+    return self.width, self.height
+
+RENDITIONS = {
+  "720p": Rendition("720p", 720, 1280, "2500k"),
+  "480p": Rendition("480p", 480, 854, "1200k", "96k"),
+  "360p": Rendition("360p", 360, 640, "700k", "64k"),
+}
+
+def renditions(names: List[str] = None) -> List[Rendition]:
+  names = EXPORT_RENDITIONS if names is None else names
+  unknown = [name for name in names if name not in RENDITIONS]
+  if unknown:
+    raise ValueError(f"Unknown renditions {unknown}. Use any of {tuple(RENDITIONS)}.")
+  return [RENDITIONS[name] for name in dict.fromkeys(names)]
+
+def rendition_path(output_path: str, name: str) -> str:
+  """{id}.mp4 -> {id}_{rendition}.mp4, no mesmo diretório."""
+  base, ext = os.path.splitext(output_path)
+  return f"{base}_{name}{ext or '.mp4'}"
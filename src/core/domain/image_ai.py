@@ -1,8 +1,17 @@
+from core.domain.cancellation import track_temp_file
+from core.domain.checkpoint_store import checkpoint_store
 from core.domain.pipeline import Step
-from core.commons.openai import generate_image_from_text, download_image_from_url
+from core.commons.openai import (
+    generate_image_from_text,
+    download_image_from_url,
+    generate_image_from_text_async,
+    download_image_from_url_async,
+)
 from typing import Callable
 
 class GenerateImageStep(Step):
+    checkpointable = True
+
     def __init__(self, name: str, description: str, input_transformer: Callable[[dict], dict] = None):
         super().__init__(name, description, input_transformer)
 
@@ -21,7 +30,34 @@ class GenerateImageStep(Step):
         # 2. Download the first image
         local_image_path = download_image_from_url(image_urls[0], use_tempfile=use_tempfile)
 
+        if use_tempfile:
+            track_temp_file(context, local_image_path)
+
         # 3. Save the result in the context
         context[self.name] = {
             output_key: local_image_path
         }
+
+    async def execute_async(self, input: dict, context: dict):
+        prompt = input["prompt"]
+        output_key = input.get("output_key", "generated_image_path")
+        size = input.get("size", "1024x1024")
+        use_tempfile = input.get("use_tempfile", False)
+
+        image_urls = await generate_image_from_text_async(prompt, n=1, size=size)
+        if not image_urls:
+            raise ValueError("Failed to generate image from prompt.")
+
+        local_image_path = await download_image_from_url_async(image_urls[0], use_tempfile=use_tempfile)
+
+        if use_tempfile:
+            track_temp_file(context, local_image_path)
+
+        context[self.name] = {
+            output_key: local_image_path
+        }
+
+    def checkpoint(self, input: dict, context: dict):
+        output_key = input.get("output_key", "generated_image_path")
+        image_path = context[self.name][output_key]
+        return {output_key: checkpoint_store.save_file(context["id"], self.checkpoint_key(context), image_path)}
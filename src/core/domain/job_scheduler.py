@@ -0,0 +1,248 @@
+import asyncio
+import os
+import socket
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Any
+from uuid import uuid4
+from core.domain.cancellation import cancellation_registry
+from core.domain.scheduler_lease_repository import SchedulerLeaseRepository
+from core.domain.video_request_repository import VideoRequestRepository
+
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "2"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "20"))
+# embedded: a API renderiza os jobs | worker: a API só enfileira e os workers (worker.py) renderizam
+RENDER_MODE = os.getenv("RENDER_MODE", "embedded")
+# Intervalo em que os jobs rodando conferem no Mongo se foram cancelados por outro processo da API
+CANCEL_POLL_INTERVAL = float(os.getenv("CANCEL_POLL_INTERVAL", "2"))
+# Lease do processo que despacha a fila no modo embedded e intervalo em que ele (re)verifica lease e fila
+SCHEDULER_LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", "30"))
+SCHEDULER_POLL_INTERVAL = float(os.getenv("SCHEDULER_POLL_INTERVAL", "2"))
+# Lease de cada job despachado no modo embedded, renovado pelo processo que o renderiza a cada ciclo;
+# vencido, o líder devolve o job à fila (ou o marca failed depois de SCHEDULER_MAX_ATTEMPTS despachos)
+SCHEDULER_JOB_LEASE_SECONDS = float(os.getenv("SCHEDULER_JOB_LEASE_SECONDS", "60"))
+SCHEDULER_MAX_ATTEMPTS = int(os.getenv("SCHEDULER_MAX_ATTEMPTS", "3"))
+
+class QueueFullError(Exception):
+  pass
+
+class JobScheduler:
+  """Fila de jobs no Mongo com limite de concorrência na frente do render executor.
+
+  Qualquer processo da API enfileira (status "queued" em video_requests). Só o processo que detém o lease
+  do scheduler despacha, então queue_position e a ordem por prioridade valem para todos os processos (ex.: os
+  workers do gunicorn). Se ele cair, outro assume quando o lease expira.
+
+  Cada job despachado leva o lease do processo que o renderiza, renovado a cada ciclo mesmo fora da liderança.
+  Os slots livres saem dos leases vivos no Mongo, então MAX_CONCURRENT_JOBS conta também os jobs de um líder
+  anterior, e os jobs de um processo que morreu voltam para a fila quando o lease deles vence.
+  """
+
+  def __init__(
+    self,
+    runner: Callable[[Dict[str, Any]], Awaitable[None]],
+    repository: VideoRequestRepository,
+    max_concurrent: int = MAX_CONCURRENT_JOBS,
+    max_queued: int = MAX_QUEUED_JOBS,
+    cancel_poll_interval: float = CANCEL_POLL_INTERVAL,
+    leases: SchedulerLeaseRepository = None,
+    lease_seconds: float = SCHEDULER_LEASE_SECONDS,
+    poll_interval: float = SCHEDULER_POLL_INTERVAL,
+    job_lease_seconds: float = SCHEDULER_JOB_LEASE_SECONDS,
+    max_attempts: int = SCHEDULER_MAX_ATTEMPTS,
+  ):
+    self.runner = runner
+    self.repository = repository
+    self.max_concurrent = max_concurrent
+    self.max_queued = max_queued
+    self.running = {}
+    self.wait_times = deque(maxlen=100)
+    self.tasks = set()
+    self.cancel_poll_interval = cancel_poll_interval
+    self.cancel_watcher = None
+    self.leases = leases or SchedulerLeaseRepository()
+    self.lease_seconds = lease_seconds
+    self.poll_interval = poll_interval
+    self.job_lease_seconds = job_lease_seconds
+    self.max_attempts = max_attempts
+    self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:8]}"
+    self.leader = False
+    self.loop_task = None
+    self.dispatch_lock = asyncio.Lock()
+
+  async def submit(self, request: Dict[str, Any], priority: int = 0):
+    if await self.repository.count_by_status("queued") >= self.max_queued:
+      raise QueueFullError(f"Render queue is full ({self.max_queued} jobs waiting)")
+
+    await self.repository.update(request["id"], {"status": "queued", "priority": priority, "queued_at": time.time(), "attempts": 0})
+    # Fora do líder o job espera o próximo ciclo dele (até SCHEDULER_POLL_INTERVAL)
+    await self.dispatch()
+
+  async def restore(self):
+    """Sobe o ciclo do scheduler; os jobs "queued" de antes de um restart continuam na fila do Mongo e os
+    despachados por um processo que morreu voltam para ela quando o lease deles vence."""
+    if self.loop_task is None:
+      self.loop_task = asyncio.create_task(self.run_loop())
+
+  async def run_loop(self):
+    while True:
+      try:
+        await self.tick()
+      except Exception as e:
+        print(f"Erro no ciclo do scheduler: {e}")
+      await asyncio.sleep(self.poll_interval)
+
+  async def tick(self):
+    was_leader = self.leader
+    self.leader = await self.leases.acquire("embedded_scheduler", self.owner, self.lease_seconds)
+    if self.leader and not was_leader:
+      print(f"🎬 Processo {self.owner} assumiu o scheduler de render")
+    await self.renew_job_leases()
+    if self.leader:
+      await self.recover_expired()
+    await self.dispatch()
+
+  async def renew_job_leases(self):
+    """Renova o lease dos jobs deste processo, líder ou não (depois de uma troca de líder eles seguem rodando aqui)."""
+    for video_id in list(self.running):
+      if await self.repository.renew_lease(video_id, self.owner, self.job_lease_seconds):
+        continue
+      doc = await self.repository.get(video_id)
+      # Lease vencido e o job devolvido à fila ou pego de novo: para o render daqui para não rodar em dobro
+      if doc and (doc.get("status") == "queued" or doc.get("lease_owner") not in (None, self.owner)):
+        print(f"⚠️ Job {video_id} perdeu o lease para outro processo, interrompendo")
+        await self.cancel(video_id)
+
+  async def recover_expired(self):
+    requeued = await self.repository.requeue_expired(self.max_attempts)
+    failed = await self.repository.fail_expired(self.max_attempts)
+    if requeued or failed:
+      print(f"♻️ Jobs com lease vencido: {requeued} devolvido(s) à fila, {failed} marcado(s) como failed")
+
+  async def dispatch(self):
+    if not self.leader:
+      return
+    async with self.dispatch_lock:
+      # Slots livres contando os jobs de todos os processos, inclusive os de um líder anterior
+      free = self.max_concurrent - await self.repository.count_leased()
+      while free > 0:
+        doc = await self.repository.claim_next_queued(self.owner, self.job_lease_seconds)
+        if doc is None:
+          break
+        free -= 1
+        doc.pop("_id", None)
+        self.wait_times.append(time.time() - doc.get("queued_at", time.time()))
+        task = asyncio.create_task(self.run_job(doc))
+        self.running[doc["id"]] = task
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+      if self.running and (self.cancel_watcher is None or self.cancel_watcher.done()):
+        self.cancel_watcher = asyncio.create_task(self.watch_cancellations())
+      await self.publish_positions()
+
+  async def cancel(self, video_id: str) -> bool:
+    """Sinaliza o cancelamento se o job roda neste processo; na fila, o status "cancelled" já o tirou (o claim só pega "queued")."""
+    task = self.running.get(video_id)
+    if task is None:
+      await self.publish_positions()
+      return False
+    if not cancellation_registry.cancel(video_id):
+      # Despachado mas o render ainda não começou: basta cancelar a task
+      task.cancel()
+    return True
+
+  async def watch_cancellations(self):
+    """O token do job só existe no processo que o renderiza: um DELETE atendido por outro processo
+    da API só grava "cancelled" no Mongo, e é aqui que o job rodando percebe."""
+    while self.running:
+      await asyncio.sleep(self.cancel_poll_interval)
+      try:
+        cancelled = await self.repository.ids_with_status(list(self.running), "cancelled")
+      except Exception as e:
+        print(f"Erro ao conferir cancelamentos: {e}")
+        continue
+      for video_id in cancelled:
+        await self.cancel(video_id)
+
+  async def run_job(self, request: Dict[str, Any]):
+    try:
+      await self.runner(request)
+    finally:
+      self.running.pop(request["id"], None)
+      try:
+        await self.repository.drop_lease(request["id"], self.owner)
+      except Exception as e:
+        # Sem renovação o lease vence sozinho e o slot volta a ficar livre
+        print(f"Erro ao liberar o lease do job {request['id']}: {e}")
+      await self.dispatch()
+
+  async def publish_positions(self):
+    if not self.leader:
+      return
+    for position, doc in enumerate(await self.repository.queued_in_order(), start=1):
+      if doc.get("queue_position") != position:
+        await self.repository.update(doc["id"], {"queue_position": position})
+
+  async def shutdown(self):
+    if self.loop_task:
+      self.loop_task.cancel()
+      self.loop_task = None
+    if self.leader:
+      # Libera na hora para outro processo assumir sem esperar o lease expirar
+      await self.leases.release("embedded_scheduler", self.owner)
+      self.leader = False
+
+  async def stats(self) -> Dict[str, Any]:
+    queued = await self.repository.queued_in_order()
+    now = time.time()
+    return {
+      # Só os jobs despachados (com lease vivo): os "pending" recém-criados ainda não entraram na fila
+      "running": await self.repository.count_leased(),
+      "queued": len(queued),
+      "max_concurrent": self.max_concurrent,
+      "max_queued": self.max_queued,
+      # Média de espera dos jobs despachados pelo líder
+      "avg_wait_sec": round(sum(self.wait_times) / len(self.wait_times), 3) if self.wait_times else 0.0,
+      "oldest_wait_sec": round(max((now - doc.get("queued_at", now) for doc in queued), default=0.0), 3),
+      "scheduler_leader": self.leader,
+    }
+
+class RemoteJobQueue:
+  """Fila no modo worker: a API só grava o job como "queued" e os workers o pegam via lease no Mongo."""
+
+  def __init__(self, repository: VideoRequestRepository, max_queued: int = MAX_QUEUED_JOBS):
+    self.repository = repository
+    self.max_queued = max_queued
+
+  async def submit(self, request: Dict[str, Any], priority: int = 0):
+    if await self.repository.count_by_status("queued") >= self.max_queued:
+      raise QueueFullError(f"Render queue is full ({self.max_queued} jobs waiting)")
+    await self.repository.update(request["id"], {"status": "queued", "priority": priority, "queued_at": time.time(), "attempts": 0})
+
+  async def restore(self):
+    pass
+
+  async def shutdown(self):
+    pass
+
+  async def cancel(self, video_id: str) -> bool:
+    # O status "cancelled" já gravado pela API tira o job da fila; o worker que o renderiza percebe no heartbeat
+    return True
+
+  async def stats(self) -> Dict[str, Any]:
+    queued = await self.repository.find_by_status("queued")
+    now = time.time()
+    return {
+      "running": await self.repository.count_by_status("processing"),
+      "queued": len(queued),
+      "max_queued": self.max_queued,
+      "oldest_wait_sec": round(max((now - doc.get("queued_at", now) for doc in queued), default=0.0), 3),
+    }
+
+def create_job_scheduler(runner, repository: VideoRequestRepository, mode: str = RENDER_MODE):
+  if mode == "embedded":
+    return JobScheduler(runner, repository)
+  if mode == "worker":
+    return RemoteJobQueue(repository)
+  raise ValueError(f"Unknown render mode '{mode}'. Use 'embedded' or 'worker'.")
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict
+from core.domain.video_metrics_repository import VideoMetricsRepository
+
+METRICS_FLUSH_SIZE = int(os.getenv("METRICS_FLUSH_SIZE", "50"))
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "10"))
+
+class MetricsSink:
+  """Acumula as métricas dos steps por vídeo e grava em lote ($push $each) no Mongo.
+
+  O flush acontece ao atingir METRICS_FLUSH_SIZE métricas ou METRICS_FLUSH_INTERVAL segundos,
+  e uma última vez quando a pipeline termina (com sucesso ou falha).
+  """
+
+  def __init__(self, repository: VideoMetricsRepository, flush_size: int = METRICS_FLUSH_SIZE, flush_interval: float = METRICS_FLUSH_INTERVAL):
+    self.repository = repository
+    self.flush_size = flush_size
+    self.flush_interval = flush_interval
+    self.buffers = defaultdict(list)
+    self.last_flush = {}
+    self.pending = defaultdict(list)
+    self.lock = threading.Lock()
+
+  def add(self, video_id: str, step_metrics: Dict[str, Any], loop):
+    """Pode ser chamado de qualquer thread; o loop é o event loop dono do cliente Mongo."""
+    with self.lock:
+      buffer = self.buffers[video_id]
+      buffer.append(step_metrics)
+      now = time.monotonic()
+      last_flush = self.last_flush.setdefault(video_id, now)
+      if len(buffer) < self.flush_size and now - last_flush < self.flush_interval:
+        return
+      batch = self.buffers.pop(video_id)
+      self.last_flush[video_id] = now
+
+    future = asyncio.run_coroutine_threadsafe(self.repository.append_steps(video_id, batch), loop)
+    with self.lock:
+      self.pending[video_id].append(future)
+
+  async def flush(self, video_id: str):
+    with self.lock:
+      batch = self.buffers.pop(video_id, [])
+      pending = self.pending.pop(video_id, [])
+      self.last_flush.pop(video_id, None)
+
+    # Espera os lotes já enviados para manter a ordem dos steps no documento
+    for future in pending:
+      try:
+        await asyncio.wrap_future(future)
+      except Exception as e:
+        print(f"Erro ao gravar métricas do vídeo {video_id}: {e}")
+
+    if batch:
+      await self.repository.append_steps(video_id, batch)
+
+  async def flush_all(self):
+    with self.lock:
+      batches = dict(self.buffers)
+      self.buffers.clear()
+      self.last_flush.clear()
+    await self.repository.bulk_append_steps(batches)
+
+metrics_sink = MetricsSink(VideoMetricsRepository())
@@ -1,13 +1,24 @@
+import os
 import json
 import psutil
 import time
 import asyncio
 from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from typing import Callable, List
-from core.domain.progress_manager import progress_manager
-from core.domain.video_metrics_repository import VideoMetricsRepository
+from core.domain.cancellation import raise_if_cancelled
+from core.domain.checkpoint_store import checkpoint_store
+from core.domain.metrics_sink import metrics_sink
+from core.domain.progress_tracker import ProgressTracker
 
-video_metrics_repo = VideoMetricsRepository()
+FOREACH_MAX_WORKERS = int(os.getenv("FOREACH_MAX_WORKERS", "4"))
+
+# Pool onde os steps síncronos (composição, export...) rodam no modo assíncrono
+step_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("STEP_EXECUTOR_WORKERS", "8")),
+    thread_name_prefix="step",
+)
 
 def make_serializable(obj):
     try:
@@ -17,23 +28,135 @@ def make_serializable(obj):
         return str(obj)
 
 class Step(ABC):
+    # Steps caros (LLM, TTS, imagens) ligam isto para serem retomados de um checkpoint
+    checkpointable = False
+    # Hooks de profiling (core/domain/profiling.py) só valem para steps folha
+    profiled = True
+
     def __init__(self, name: str, description: str, input_transformer: Callable[[dict], dict] = None):
         self.name = name
         self.description = description
         self.input_transformer = input_transformer
 
     def run(self, context: dict):
-        if "loop" not in context:
-            raise RuntimeError(f"Missing 'loop' in context at step '{self.name}'! Você deve sempre passar o 'loop' no contexto em todas execuções de steps e pipelines!")
-        pipeline_id = context.get("id")
-        loop = context["loop"]
-        input_data = self.input_transformer(context) if self.input_transformer else {}
+        input_data = self.prepare(context)
+        with self.tracked_run(context) as outcome:
+            outcome["restored"] = self.restore_checkpoint(input_data, context)
+            if not outcome["restored"]:
+                outcome["profile"] = self.execute_profiled(input_data, context)
+                self.save_checkpoint(input_data, context)
+
+    async def run_async(self, context: dict):
+        input_data = self.prepare(context)
+        with self.tracked_run(context) as outcome:
+            loop = asyncio.get_running_loop()
+            outcome["restored"] = self.checkpointable and await loop.run_in_executor(step_executor, self.restore_checkpoint, input_data, context)
+            if not outcome["restored"]:
+                outcome["profile"] = await self.execute_async_profiled(input_data, context)
+                if self.checkpointable:
+                    await loop.run_in_executor(step_executor, self.save_checkpoint, input_data, context)
+
+    @contextmanager
+    def tracked_run(self, context: dict):
+        """Parte comum de run e run_async: eventos do tracker, tempo, memória e métricas do step.
+
+        O corpo preenche outcome["restored"] e outcome["profile"].
+        """
+        tracker = context.get("progress_tracker")
+        if tracker:
+            tracker.step_started(self, context)
 
         start_time = time.perf_counter()
         mem_before = psutil.Process().memory_info().rss / 1024**2
 
-        self.execute(input_data, context)
+        outcome = {"restored": False, "profile": {}}
+        try:
+            yield outcome
+        except Exception:
+            if tracker:
+                tracker.step_failed(self, context)
+            raise
+
+        step_metrics = self.record_metrics(context, start_time, mem_before, outcome["restored"], outcome["profile"])
+        if tracker:
+            tracker.step_finished(self, context, step_metrics)
+
+    def prepare(self, context: dict):
+        if "loop" not in context:
+            raise RuntimeError(f"Missing 'loop' in context at step '{self.name}'! Você deve sempre passar o 'loop' no contexto em todas execuções de steps e pipelines!")
+        return self.input_transformer(context) if self.input_transformer else {}
+
+    def checkpoint_key(self, context: dict) -> str:
+        return context.get("step_path", "") + self.name
+
+    def checkpoint(self, input: dict, context: dict):
+        """Payload serializável que permite restaurar a saída do step sem executá-lo de novo."""
+        return context.get(self.name)
+
+    def restore(self, payload, input: dict, context: dict):
+        context[self.name] = payload
+
+    def restore_checkpoint(self, input: dict, context: dict) -> bool:
+        if not self.checkpointable or not context.get("id"):
+            return False
+        payload = checkpoint_store.load(context["id"], self.checkpoint_key(context))
+        if payload is None:
+            if context.get("replay"):
+                # Refazer o step geraria outro conteúdo (LLM, TTS) do que o já renderizado
+                raise RuntimeError(f"Step {self.checkpoint_key(context)} sem checkpoint para reconstruir a timeline")
+            return False
+        self.restore(payload, input, context)
+        print(f"♻️ Step {self.checkpoint_key(context)} restaurado do checkpoint")
+        return True
 
+    def save_checkpoint(self, input: dict, context: dict):
+        if not self.checkpointable or not context.get("id"):
+            return
+        checkpoint_store.save(context["id"], self.checkpoint_key(context), self.checkpoint(input, context))
+
+    def execute_profiled(self, input: dict, context: dict) -> dict:
+        hooks = context.get("step_hooks", []) if self.profiled else []
+        states = []
+        succeeded = False
+        try:
+            for hook in hooks:
+                states.append(hook.before(self, context))
+            self.execute(input, context)
+            succeeded = True
+        finally:
+            profile = self.finish_hooks(hooks, states, context, succeeded)
+        return profile
+
+    async def execute_async_profiled(self, input: dict, context: dict) -> dict:
+        if type(self).execute_async is Step.execute_async:
+            # Sem versão nativa: os hooks rodam na thread do executor, junto com o execute
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(step_executor, self.execute_profiled, input, context)
+
+        # Steps assíncronos nativos: medição aproximada, o event loop é compartilhado com outras tasks
+        hooks = [hook for hook in context.get("step_hooks", []) if not hook.thread_bound] if self.profiled else []
+        states = []
+        succeeded = False
+        try:
+            for hook in hooks:
+                states.append(hook.before(self, context))
+            await self.execute_async(input, context)
+            succeeded = True
+        finally:
+            profile = self.finish_hooks(hooks, states, context, succeeded)
+        return profile
+
+    def finish_hooks(self, hooks: list, states: list, context: dict, succeeded: bool) -> dict:
+        """after dos hooks que rodaram o before, na ordem inversa; se o step falhou, só o cleanup."""
+        profile = {}
+        for hook, state in reversed(list(zip(hooks, states))):
+            if succeeded:
+                hook.after(self, context, state, profile)
+            else:
+                hook.cleanup(self, context, state)
+        return profile
+
+    def record_metrics(self, context: dict, start_time: float, mem_before: float, restored: bool = False, profile: dict = None):
         end_time = time.perf_counter()
         mem_after = psutil.Process().memory_info().rss / 1024**2
 
@@ -44,21 +167,32 @@ class Step(ABC):
             "step": self.name,
             "description": self.description,
             "duration_sec": duration,
-            "memory_diff_mb": memory_mb
+            "memory_diff_mb": memory_mb,
+            "from_checkpoint": restored,
+            **(profile or {})
         }
 
         context.setdefault("metrics", []).append(step_metrics)
 
-        asyncio.run_coroutine_threadsafe(
-            video_metrics_repo.append_step(pipeline_id, step_metrics),
-            loop
-        )
+        if not context.get("replay"):
+            metrics_sink.add(context.get("id"), step_metrics, context["loop"])
+        return step_metrics
 
     @abstractmethod
     def execute(self, input: dict, context: dict):
         pass
 
+    async def execute_async(self, input: dict, context: dict):
+        """Por padrão roda o execute síncrono no step_executor, sem bloquear o event loop.
+
+        Steps dominados por I/O (LLM, TTS, download) sobrescrevem este método com chamadas nativas.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(step_executor, self.execute, input, context)
+
 class LoopStep(Step):
+    profiled = False
+
     def __init__(self, name: str, description: str, times: int = 1, step: Step = None):
         super().__init__(name, description)
         self.times = times
@@ -67,35 +201,147 @@ class LoopStep(Step):
     def flatten_steps(self):
         return self.step.flatten_steps() if isinstance(self.step, Pipeline) else [self.step]
 
-    def execute(self, input: dict, context: dict):
+    def iterations(self, context: dict):
+        """Prepara o contexto de cada volta (loop_index e step_path) para o execute e o execute_async."""
         n = context.get("n", self.times)
+        parent_path = context.get("step_path", "")
         for i in range(n):
+            raise_if_cancelled(context)
             context["loop_index"] = i
+            context["step_path"] = f"{parent_path}{self.name}[{i}]/"
+            yield i
+        context["step_path"] = parent_path
+
+    def execute(self, input: dict, context: dict):
+        for _ in self.iterations(context):
             self.step.run(context)  # context é sempre o mesmo, inclui o loop
 
+    async def execute_async(self, input: dict, context: dict):
+        for _ in self.iterations(context):
+            await self.step.run_async(context)
+
 class ForeachStep(Step):
-    def __init__(self, name: str, description: str, input_transformer: Callable[[dict], dict] = None, step: Step = None):
+    profiled = False
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        input_transformer: Callable[[dict], dict] = None,
+        step: Step = None,
+        parallel: bool = False,
+        max_workers: int = None,
+    ):
         super().__init__(name, description, input_transformer)
         self.step = step
+        self.parallel = parallel
+        self.max_workers = max_workers or FOREACH_MAX_WORKERS
 
     def flatten_steps(self):
         return self.step.flatten_steps() if isinstance(self.step, Pipeline) else [self.step]
 
     def execute(self, input: dict, context: dict):
-        items = input.get("items", [])
+        self.run_items(input.get("items", []), context)
+
+    async def execute_async(self, input: dict, context: dict):
+        await self.run_items_async(input.get("items", []), context)
+
+    def run_items(self, items: list, context: dict):
+        if not self.parallel or len(items) < 2:
+            for _ in self.sequential_items(items, context):
+                self.step.run(context)  # context é sempre o mesmo, inclui o loop
+            return
+
+        def run_item(i, item):
+            item_context = self.start_item(context, item, i)
+            self.step.run(item_context)
+            return item_context
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            futures = [executor.submit(run_item, i, item) for i, item in enumerate(items)]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            if any(future.exception() for future in done):
+                # Primeiro erro: os itens que ainda não começaram nem rodam
+                for future in futures:
+                    future.cancel()
+            # result() na ordem de submissão: mantém a ordem dos composites e propaga o primeiro erro
+            item_contexts = [future.result() for future in futures]
+
+        self.merge_items(context, items, item_contexts)
+
+    async def run_items_async(self, items: list, context: dict):
+        if not self.parallel or len(items) < 2:
+            for _ in self.sequential_items(items, context):
+                await self.step.run_async(context)
+            return
+
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def run_item(i, item):
+            async with semaphore:
+                item_context = self.start_item(context, item, i)
+                await self.step.run_async(item_context)
+                return item_context
+
+        tasks = [asyncio.ensure_future(run_item(i, item)) for i, item in enumerate(items)]
+        try:
+            item_contexts = await asyncio.gather(*tasks)
+        except BaseException:
+            # Primeiro erro (ou cancelamento): os irmãos param em vez de seguir até o fim
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        self.merge_items(context, items, item_contexts)
+
+    def sequential_items(self, items: list, context: dict):
+        """Itens um a um no próprio contexto (current e step_path), para o run_items e o run_items_async."""
+        parent_path = context.get("step_path", "")
         for i, item in enumerate(items):
+            raise_if_cancelled(context)
             context["current"] = item
-            self.step.run(context)  # context é sempre o mesmo, inclui o loop
+            context["step_path"] = self.item_path(parent_path, i)
+            yield item
+        context["step_path"] = parent_path
+
+    def start_item(self, context: dict, item, index: int) -> dict:
+        # Itens ainda na fila do pool saem logo quando o job é cancelado
+        raise_if_cancelled(context)
+        return self.item_context(context, item, index)
+
+    def merge_items(self, context: dict, items: list, item_contexts: list):
+        for item_context in item_contexts:
+            self.merge_item_context(context, item_context)
+        context["current"] = items[-1]
+
+    def item_path(self, parent_path: str, index: int) -> str:
+        return f"{parent_path}{self.name}[{index}]/"
+
+    def item_context(self, context: dict, item, index: int) -> dict:
+        """Overlay raso do contexto para um item: escritas de cada item ficam isoladas."""
+        item_context = dict(context)
+        item_context["current"] = item
+        item_context["step_path"] = self.item_path(context.get("step_path", ""), index)
+        item_context["composites"] = []
+        item_context["metrics"] = []
+        return item_context
+
+    def merge_item_context(self, context: dict, item_context: dict):
+        context["composites"] = context.get("composites", []) + item_context["composites"]
+        context.setdefault("metrics", []).extend(item_context["metrics"])
 
 class Pipeline(Step):
     def __init__(self, name: str, description: str, steps: List[Step]):
         super().__init__(name, description)
         self.steps = steps
+        # Os steps não mudam depois de construídos: o plano achatado é calculado uma vez só
+        self.flat_steps = self.build_flat_steps()
 
     def execute(self, input: dict, context: dict):
         pass
 
-    def flatten_steps(self) -> List[Step]:
+    def build_flat_steps(self) -> List[Step]:
         flat = []
         for step in self.steps:
             if isinstance(step, Pipeline):
@@ -106,38 +352,38 @@ class Pipeline(Step):
                 flat.append(step)
         return flat
 
+    def flatten_steps(self) -> List[Step]:
+        return self.flat_steps
+
     def run(self, context: dict):
+        with self.progress(context):
+            for step in self.steps:
+                raise_if_cancelled(context)
+                step.run(context)
+
+    async def run_async(self, context: dict):
+        with self.progress(context):
+            for step in self.steps:
+                raise_if_cancelled(context)
+                await step.run_async(context)
+
+    @contextmanager
+    def progress(self, context: dict):
+        tracker = self.start_progress(context)
+        try:
+            yield tracker
+        finally:
+            if tracker:
+                tracker.finish()
+                context.pop("progress_tracker", None)
+
+    def start_progress(self, context: dict):
+        """Só a pipeline raiz cria o tracker e publica o plano; as aninhadas reaproveitam o do contexto."""
         if "loop" not in context:
             raise RuntimeError(f"Missing 'loop' in context at step 'Pipeline: {self.name}'! Você deve sempre passar o 'loop' no contexto em todas execuções de steps e pipelines!")
-        pipeline_id = context.get("id")
-        flat_steps = self.flatten_steps()
-        step_index = 0
-
-        def publish_progress():
-            progress_manager.publish(pipeline_id, json.dumps({
-                "executed": [
-                    {"name": s.name, "description": s.description}
-                    for s in flat_steps[:step_index]
-                ],
-                "running": [
-                    {"name": s.name, "description": s.description}
-                    for s in flat_steps[step_index:]
-                ]
-            }))
-
-        for step in self.steps:
-            if isinstance(step, Pipeline):
-                step.run(context)
-                step_index += len(step.flatten_steps())
-            elif isinstance(step, ForeachStep):
-                input_data = step.input_transformer(context) if step.input_transformer else {}
-                items = input_data.get("items", [])
-                for i, item in enumerate(items):
-                    context["current"] = item
-                    publish_progress()
-                    step.step.run(context)
-                    step_index += 1
-            else:
-                publish_progress()
-                step.run(context)
-                step_index += 1
+        if "progress_tracker" in context:
+            return None
+        tracker = ProgressTracker(context.get("id"), self.flat_steps)
+        context["progress_tracker"] = tracker
+        tracker.publish_plan()
+        return tracker
@@ -0,0 +1,122 @@
+import cProfile
+import os
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from typing import List, Optional
+
+PROFILE_PATH = os.getenv("PROFILE_PATH", "profiles")
+# Hooks ligados por padrão, ex.: STEP_PROFILING=cpu,tracemalloc,cprofile
+STEP_PROFILING = os.getenv("STEP_PROFILING", "")
+
+class StepHook:
+  """Hook chamado em volta do execute de cada step, na mesma thread que faz o trabalho."""
+
+  # Hooks que não podem ser aninhados na mesma thread (ex.: cProfile) não rodam no event loop
+  thread_bound = False
+
+  def before(self, step, context: dict):
+    return None
+
+  def after(self, step, context: dict, state, profile: dict):
+    pass
+
+  def cleanup(self, step, context: dict, state):
+    """Chamado no lugar do after quando o step falha: libera o que o before ligou, sem medir."""
+    pass
+
+class CpuTimeHook(StepHook):
+  # thread_time mede só a thread do step, ao contrário do delta de RSS com steps concorrentes
+  def before(self, step, context: dict):
+    return time.thread_time()
+
+  def after(self, step, context: dict, state, profile: dict):
+    profile["cpu_time_sec"] = round(time.thread_time() - state, 3)
+
+class TracemallocHook(StepHook):
+  # O tracemalloc é global ao processo: com itens em paralelo o pico inclui os steps concorrentes.
+  # Contagem dos steps medindo: o último a terminar (com sucesso ou não) desliga o tracing
+  active = 0
+  lock = threading.Lock()
+
+  def before(self, step, context: dict):
+    with TracemallocHook.lock:
+      if TracemallocHook.active == 0 and not tracemalloc.is_tracing():
+        tracemalloc.start()
+      TracemallocHook.active += 1
+    tracemalloc.reset_peak()
+    return tracemalloc.get_traced_memory()[0]
+
+  def after(self, step, context: dict, state, profile: dict):
+    _, peak = tracemalloc.get_traced_memory()
+    profile["tracemalloc_peak_mb"] = round((peak - state) / 1024**2, 2)
+    self.release()
+
+  def cleanup(self, step, context: dict, state):
+    self.release()
+
+  def release(self):
+    with TracemallocHook.lock:
+      TracemallocHook.active -= 1
+      if TracemallocHook.active == 0:
+        tracemalloc.stop()
+
+class CProfileHook(StepHook):
+  thread_bound = True
+
+  def __init__(self, base_path: str = PROFILE_PATH):
+    self.base_path = base_path
+
+  def before(self, step, context: dict):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+  def after(self, step, context: dict, state, profile: dict):
+    state.disable()
+    file_name = profile_file_name(step.checkpoint_key(context))
+    directory = os.path.join(self.base_path, context.get("id", "unknown"))
+    os.makedirs(directory, exist_ok=True)
+    state.dump_stats(os.path.join(directory, file_name))
+    profile["profile_file"] = file_name
+
+  def cleanup(self, step, context: dict, state):
+    # O step_executor reaproveita a thread: o profiler não pode ficar ligado nela
+    state.disable()
+
+HOOKS = {
+  "cpu": CpuTimeHook,
+  "tracemalloc": TracemallocHook,
+  "cprofile": CProfileHook,
+}
+
+def build_hooks(names: Optional[List[str]] = None) -> List[StepHook]:
+  if names is None:
+    names = [name.strip() for name in STEP_PROFILING.split(",") if name.strip()]
+  unknown = [name for name in names if name not in HOOKS]
+  if unknown:
+    raise ValueError(f"Unknown profiling hooks: {', '.join(unknown)}. Available: {', '.join(HOOKS)}")
+  return [HOOKS[name]() for name in names]
+
+def profile_file_name(step_path: str) -> str:
+  return re.sub(r"[^A-Za-z0-9_.\[\]-]", "__", step_path) + ".prof"
+
+def profile_dir(video_id: str) -> str:
+  """Diretório dos dumps de um vídeo; só aceita UUIDs, para o id não sair de PROFILE_PATH."""
+  try:
+    video_id = str(uuid.UUID(video_id))
+  except (ValueError, TypeError, AttributeError):
+    raise ValueError(f"Invalid video id '{video_id}'")
+  return os.path.join(PROFILE_PATH, video_id)
+
+def profile_path(video_id: str, file_name: str) -> str:
+  """Caminho real de um dump .prof do vídeo; ValueError para qualquer coisa fora de PROFILE_PATH."""
+  if not file_name.endswith(".prof") or os.path.basename(file_name) != file_name:
+    raise ValueError(f"Invalid profile file '{file_name}'")
+  base = os.path.realpath(PROFILE_PATH)
+  path = os.path.realpath(os.path.join(profile_dir(video_id), file_name))
+  if os.path.commonpath([base, path]) != base:
+    raise ValueError(f"Invalid profile file '{file_name}'")
+  return path
@@ -1,55 +1,93 @@
 import numpy as np
-from moviepy import ImageSequenceClip, AudioFileClip, concatenate_videoclips
+from functools import lru_cache
+from moviepy import VideoClip
+from moviepy.audio.AudioClip import AudioArrayClip
 from PIL import Image, ImageDraw
+from core.commons.asset_cache import asset_cache
 from core.domain.pipeline import Step
 from typing import Callable
 
-class GenerateProgressBarStep(Step):
-    def __init__(self, name: str, description: str, input_transformer: Callable[[dict], dict] = None):
-        super().__init__(name, description, input_transformer)
+@lru_cache(maxsize=16)
+def progress_bar_sprites(width, height, border_color, progress_color, border_radius, border_thickness, n_frames):
+    """Frames RGB e máscaras da barra (1/n ... n/n), desenhados uma vez por estilo e compartilhados entre as perguntas."""
+    def draw_progress_bar(progress):
+        img = Image.new("RGBA", (width, height), (0, 0, 0, 0))  # Fundo transparente
+        draw = ImageDraw.Draw(img)
 
-    def execute(self, input: dict, context: dict):
-        width, height = input.get('width', 800), input.get('height', 100)
-        duration_per_frame = input.get('duration_per_frame', 0.5)
-
-        border_color = (200, 200, 200, 255)
-        progress_color = (0, 204, 0, 255)
-        border_radius = 50
-        border_thickness = 6
-        audio_path = input.get('audio_path', 'src/core/assets/clock.wav')
-
-        def draw_progress_bar(progress):
-            img = Image.new("RGBA", (width, height), (0, 0, 0, 0))  # Fundo transparente
-            draw = ImageDraw.Draw(img)
+        draw.rounded_rectangle(
+            [(0, 0), (width-1, height-1)],
+            radius=border_radius,
+            outline=border_color,
+            width=border_thickness
+        )
 
+        inner_width = int((width - 2 * border_thickness) * progress)
+        if inner_width > 0:
             draw.rounded_rectangle(
-                [(0, 0), (width-1, height-1)],
+                [(border_thickness, border_thickness), (border_thickness + inner_width, height - border_thickness)],
                 radius=border_radius,
-                outline=border_color,
-                width=border_thickness
+                fill=progress_color
             )
 
-            inner_width = int((width - 2 * border_thickness) * progress)
-            if inner_width > 0:
-                draw.rounded_rectangle(
-                    [(border_thickness, border_thickness), (border_thickness + inner_width, height - border_thickness)],
-                    radius=border_radius,
-                    fill=progress_color
-                )
+        return np.array(img)
+
+    sprites = np.stack([draw_progress_bar(i / n_frames) for i in range(1, n_frames + 1)])
+    frames = np.ascontiguousarray(sprites[:, :, :, :3])
+    masks = sprites[:, :, :, 3] / 255.0
+    frames.flags.writeable = False
+    masks.flags.writeable = False
+    return frames, masks
+
+def tick_track(audio_path: str, n_ticks: int, interval: float) -> AudioArrayClip:
+    """Um tick a cada `interval` segundos, somados num único array (o PCM do arquivo é decodificado uma vez)."""
+    samples, fps = asset_cache.audio_samples(audio_path)
+    offsets = [int(round(i * interval * fps)) for i in range(n_ticks)]
+    track = np.zeros((offsets[-1] + len(samples), samples.shape[1]), dtype=samples.dtype)
+    for offset in offsets:
+        track[offset:offset + len(samples)] += samples
+    return AudioArrayClip(track, fps=fps)
 
-            return np.array(img)
+class ProgressBar:
+    """Barra de progresso em n degraus, um a cada `duration_per_frame`, com o tick do relógio nos primeiros degraus."""
 
-        frames = [draw_progress_bar(i / 10.0) for i in range(1, 11)]
+    def __init__(
+        self,
+        width: int = 800,
+        height: int = 100,
+        border_color=(200, 200, 200, 255),
+        progress_color=(0, 204, 0, 255),
+        border_radius: int = 50,
+        border_thickness: int = 6,
+        n_frames: int = 10,
+    ):
+        self.frames, self.masks = progress_bar_sprites(
+            width, height, tuple(border_color), tuple(progress_color), border_radius, border_thickness, n_frames
+        )
 
-        clips = []
-        for i, frame in enumerate(frames):
-            clip = ImageSequenceClip([frame], durations=[duration_per_frame])
-            if i < len(frames) - 2:
-                audio_clip = AudioFileClip(audio_path)
-                clip = clip.with_audio(audio_clip)
-            clips.append(clip)
+    def clip(self, duration_per_frame: float, audio_path: str = None, ticks: int = None) -> VideoClip:
+        n_frames = len(self.frames)
+        duration = n_frames * duration_per_frame
+
+        def frame_index(t):
+            return min(int(t / duration_per_frame), n_frames - 1)
+
+        clip = VideoClip(lambda t: self.frames[frame_index(t)], duration=duration)
+        clip = clip.with_mask(VideoClip(lambda t: self.masks[frame_index(t)], is_mask=True, duration=duration))
+        if audio_path:
+            # Os dois últimos degraus ficam em silêncio
+            clip = clip.with_audio(tick_track(audio_path, ticks if ticks is not None else n_frames - 2, duration_per_frame))
+        return clip
+
+class GenerateProgressBarStep(Step):
+    def __init__(self, name: str, description: str, input_transformer: Callable[[dict], dict] = None):
+        super().__init__(name, description, input_transformer)
+
+    def execute(self, input: dict, context: dict):
+        width, height = input.get('width', 800), input.get('height', 100)
+        duration_per_frame = input.get('duration_per_frame', 0.5)
+        audio_path = input.get('audio_path', 'src/core/assets/clock.wav')
 
-        progress_clip = concatenate_videoclips(clips)
+        progress_clip = ProgressBar(width, height).clip(duration_per_frame, audio_path)
 
         context[self.name] = {
             "progress_clip": progress_clip,
@@ -4,10 +4,15 @@ from typing import Callable
 class ProgressManager:
   def __init__(self):
     self.subscribers = defaultdict(list)
+    self.snapshots = {}
 
   def subscribe(self, pipeline_id: str, callback: Callable[[str], None]):
     print(f"🔔 Subscrito ao pipeline {pipeline_id}")
     self.subscribers[pipeline_id].append(callback)
+    # Quem entra no meio da execução recebe o snapshot antes dos deltas
+    snapshot = self.snapshots.get(pipeline_id)
+    if snapshot:
+      callback(snapshot)
 
   def unsubscribe(self, pipeline_id: str, callback: Callable[[str], None]):
     print(f"🔕 Removido do pipeline {pipeline_id}")
@@ -19,4 +24,11 @@ class ProgressManager:
     for callback in self.subscribers[pipeline_id]:
       callback(message)
 
+  def publish_snapshot(self, pipeline_id: str, message: str):
+    self.snapshots[pipeline_id] = message
+    self.publish(pipeline_id, message)
+
+  def clear_snapshot(self, pipeline_id: str):
+    self.snapshots.pop(pipeline_id, None)
+
 progress_manager = ProgressManager()
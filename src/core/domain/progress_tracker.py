@@ -0,0 +1,53 @@
+import json
+import time
+from typing import List
+from core.domain.progress_manager import progress_manager
+
+class ProgressTracker:
+  """Publica o plano de steps uma única vez e depois apenas eventos incrementais (delta) por step.
+
+  Protocolo:
+    {"event": "step_plan", "steps": [{"index", "name", "description"}, ...]}
+    {"event": "step_progress", "index", "status": running|completed|failed, "path", "elapsed_sec", ["duration_sec"]}
+  """
+
+  def __init__(self, pipeline_id: str, flat_steps: List):
+    self.pipeline_id = pipeline_id
+    self.flat_steps = flat_steps
+    self.plan_index = {id(step): i for i, step in enumerate(flat_steps)}
+    self.started_at = time.perf_counter()
+
+  def publish_plan(self):
+    progress_manager.publish_snapshot(self.pipeline_id, json.dumps({
+      "event": "step_plan",
+      "steps": [
+        {"index": i, "name": s.name, "description": s.description}
+        for i, s in enumerate(self.flat_steps)
+      ]
+    }))
+
+  def step_started(self, step, context: dict):
+    self.publish_delta(step, context, "running")
+
+  def step_finished(self, step, context: dict, step_metrics: dict):
+    self.publish_delta(step, context, "completed", duration_sec=step_metrics["duration_sec"])
+
+  def step_failed(self, step, context: dict):
+    self.publish_delta(step, context, "failed")
+
+  def publish_delta(self, step, context: dict, status: str, **extra):
+    index = self.plan_index.get(id(step))
+    if index is None:
+      # Pipelines, Foreach e Loop não fazem parte do plano, só os steps folha
+      return
+    progress_manager.publish(self.pipeline_id, json.dumps({
+      "event": "step_progress",
+      "index": index,
+      "status": status,
+      "path": context.get("step_path", ""),
+      "elapsed_sec": round(time.perf_counter() - self.started_at, 3),
+      **extra
+    }))
+
+  def finish(self):
+    progress_manager.clear_snapshot(self.pipeline_id)
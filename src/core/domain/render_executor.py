@@ -0,0 +1,188 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from core.commons.asset_cache import warm_asset_cache
+from core.config.pipeline_factory import pipeline_factory
+from core.domain.cancellation import CancellationToken, PipelineCancelled, cancellation_registry
+from core.domain.checkpoint_store import checkpoint_store
+from core.domain.export_profile import export_profile
+from core.domain.metrics_sink import metrics_sink
+from core.domain.profiling import build_hooks
+from core.domain.progress_manager import progress_manager
+from core.domain.segment_encoder import SegmentEncoder
+from core.domain.segmented_export import EXPORT_MODE
+from core.domain.video_request_repository import VideoRequestRepository
+
+# local: pipeline no event loop da API | process: pipeline num pool de processos de render
+RENDER_EXECUTOR = os.getenv("RENDER_EXECUTOR", "local")
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 1)))
+# Status em que um vídeo ainda vai usar os checkpoints (resume e novo export passam pela fila)
+ACTIVE_STATUSES = ["queued", "pending", "processing"]
+
+video_request_repo = VideoRequestRepository()
+
+def create_context(video_id: str, request: dict, loop, cancel_token: CancellationToken = None) -> dict:
+  """Monta o contexto inicial da pipeline a partir dos campos salvos em video_requests."""
+  profile = export_profile(request.get("export_profile"))
+  return {
+    "id": video_id,
+    # Pedido original: o export segmentado reconstrói a timeline a partir dele nos processos do pool
+    "request": request,
+    "text": request["text"],
+    "n": request["n"],
+    "number": request["n"],
+    "tone_prompt": request["tone_prompt"],
+    "pipeline": request["pipeline"],
+    "step_hooks": build_hooks(request.get("profiling")),
+    "cancel_token": cancel_token,
+    "export_profile": profile.name,
+    "renditions": request.get("renditions"),
+    "segment_encoder": SegmentEncoder(video_id, profile, cancel_token=cancel_token) if EXPORT_MODE == "streamed" else None,
+    "loop": loop
+  }
+
+async def run_request(request: dict, cancel_token: CancellationToken = None):
+  pipeline = pipeline_factory.create(request["pipeline"])
+  context = create_context(request["id"], request, asyncio.get_running_loop(), cancel_token)
+  try:
+    await pipeline.run_async(context)
+  except PipelineCancelled:
+    print(f"🛑 Pipeline do vídeo {request['id']} cancelada")
+    raise
+  finally:
+    if context["segment_encoder"]:
+      await asyncio.get_running_loop().run_in_executor(None, context["segment_encoder"].close)
+    if cancel_token:
+      # Temporários e cópias do TTS do job: os steps que precisam deles de novo usam os checkpoints
+      cancel_token.cleanup()
+    await metrics_sink.flush(request["id"])
+    await prune_checkpoints(request["id"])
+
+async def prune_checkpoints(video_id: str):
+  """Retenção dos checkpoints: os deste job ficam para resume e novos exports, e os dos vídeos na fila ou
+  renderizando (em qualquer processo, pod ou worker) vêm do Mongo, não do registry deste processo."""
+  try:
+    active = await video_request_repo.ids_in_statuses(ACTIVE_STATUSES)
+  except Exception as e:
+    # Sem saber quais vídeos estão ativos não dá para apagar nada com segurança
+    print(f"Erro ao consultar os vídeos ativos, retenção dos checkpoints adiada: {e}")
+    return
+  try:
+    removed = await asyncio.get_running_loop().run_in_executor(None, checkpoint_store.prune, [video_id] + active)
+  except OSError as e:
+    print(f"Erro ao limpar checkpoints antigos: {e}")
+    return
+  if removed:
+    print(f"🧹 Checkpoints de {removed} vídeo(s) removidos pela retenção")
+
+class LocalRenderExecutor:
+  """Roda a pipeline no próprio processo da API, no event loop corrente."""
+
+  async def run(self, request: dict):
+    cancel_token = cancellation_registry.create(request["id"])
+    try:
+      await run_request(request, cancel_token)
+    finally:
+      cancellation_registry.remove(request["id"])
+
+  def warm(self):
+    # Em background: a API sobe sem esperar o decode dos assets
+    threading.Thread(target=warm_asset_cache, name="asset-warmup", daemon=True).start()
+
+  def shutdown(self):
+    pass
+
+# Event loop persistente de cada processo de render: o cliente Mongo (motor) fica preso ao loop em que foi usado
+_worker_loop = None
+
+def watch_cancel_event(cancel_event, cancel_token: CancellationToken, done: threading.Event):
+  """Repassa o Event do Manager (setado na API) para o token local do processo de render."""
+  while not done.is_set():
+    if cancel_event.wait(0.5):
+      cancel_token.cancel()
+      return
+
+def render_in_process(request: dict, progress_queue, cancel_event):
+  """Ponto de entrada no processo filho: o contexto é montado lá, só o request (picklable) atravessa o processo."""
+  global _worker_loop
+  if _worker_loop is None:
+    _worker_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker_loop)
+
+  def forward(message: str):
+    progress_queue.put(message)
+
+  cancel_token = CancellationToken()
+  done = threading.Event()
+  watcher = threading.Thread(target=watch_cancel_event, args=(cancel_event, cancel_token, done), daemon=True)
+  watcher.start()
+
+  progress_manager.subscribe(request["id"], forward)
+  try:
+    _worker_loop.run_until_complete(run_request(request, cancel_token))
+  finally:
+    done.set()
+    progress_manager.unsubscribe(request["id"], forward)
+    progress_queue.put(None)
+
+class ProcessRenderExecutor:
+  """Roda cada pipeline num processo do pool, para a composição/encode (presos ao GIL) usarem todos os núcleos.
+
+  O progresso volta para a API por uma fila e é republicado no progress_manager local.
+  """
+
+  def __init__(self, max_workers: int = RENDER_WORKERS):
+    self.max_workers = max_workers
+    self.mp_context = multiprocessing.get_context("spawn")
+    self.pool = None
+    self.manager = None
+
+  def start(self):
+    if self.pool is None:
+      # Cada processo de render tem o seu cache de assets, aquecido quando o processo sobe
+      self.pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self.mp_context, initializer=warm_asset_cache)
+      self.manager = self.mp_context.Manager()
+
+  async def run(self, request: dict):
+    self.start()
+    progress_queue = self.manager.Queue()
+    cancel_event = self.manager.Event()
+    cancellation_registry.create(request["id"]).on_cancel(cancel_event.set)
+    relay = asyncio.create_task(self.relay_progress(request["id"], progress_queue))
+    try:
+      await asyncio.wrap_future(self.pool.submit(render_in_process, request, progress_queue, cancel_event))
+    finally:
+      cancellation_registry.remove(request["id"])
+      # Garante o fim do relay mesmo se o processo filho morreu sem mandar o sentinela
+      progress_queue.put(None)
+      await relay
+
+  def warm(self):
+    # O cache vive nos processos do pool (initializer); aqui só cria o pool
+    self.start()
+
+  async def relay_progress(self, video_id: str, progress_queue):
+    loop = asyncio.get_running_loop()
+    while True:
+      message = await loop.run_in_executor(None, progress_queue.get)
+      if message is None:
+        break
+      progress_manager.publish(video_id, message)
+
+  def shutdown(self):
+    if self.pool is not None:
+      self.pool.shutdown(wait=False, cancel_futures=True)
+      self.manager.shutdown()
+      self.pool = None
+      self.manager = None
+
+def create_render_executor(kind: str = RENDER_EXECUTOR):
+  if kind == "process":
+    return ProcessRenderExecutor()
+  if kind == "local":
+    return LocalRenderExecutor()
+  raise ValueError(f"Unknown render executor '{kind}'. Use 'local' or 'process'.")
+
+render_executor = create_render_executor()
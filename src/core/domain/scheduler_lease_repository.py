@@ -0,0 +1,28 @@
+import time
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from core.commons.mongo import db
+
+class SchedulerLeaseRepository:
+    """Lease com dono e validade no Mongo: um único processo (entre os workers do gunicorn) despacha a fila."""
+
+    def __init__(self, collection=None):
+        self.collection = collection if collection is not None else db["scheduler_leases"]
+
+    async def acquire(self, name: str, owner: str, lease_seconds: float) -> bool:
+        """Pega o lease livre/expirado ou renova o próprio; False se outro processo o detém."""
+        now = time.time()
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": owner, "expires_at": now + lease_seconds}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # O upsert colidiu com o lease válido de outro processo
+            return False
+        return doc is not None and doc.get("owner") == owner
+
+    async def release(self, name: str, owner: str):
+        await self.collection.delete_one({"_id": name, "owner": owner})
@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from core.commons.ffmpeg import kill_writers, mux_segments
+from core.domain.audio_mixer import AudioMixer, load_music
+from core.domain.cancellation import CancellationToken
+from core.domain.export_profile import ExportProfile, export_profile
+from core.domain.pipeline import Step
+from core.domain.segmented_export import write_frames
+
+SEGMENT_ENCODER_WORKERS = int(os.getenv("SEGMENT_ENCODER_WORKERS", "2"))
+AUDIO_SAMPLE_RATE = 44100
+
+def emit_composites(context: dict, clips: list):
+  """Adiciona os composites prontos à timeline.
+
+  No modo streamed eles só vão para o encoder no EncodeSegmentsStep, depois do último step que usa os clips
+  (ex.: a resposta correta reaproveita as legendas da pergunta e das alternativas), para o encoder não
+  disputar os readers dos clips com a pipeline.
+  """
+  context["composites"] = context.get("composites", []) + clips
+
+class EncodeSegmentsStep(Step):
+  """Manda codificar em background os composites da timeline que ainda não foram para o encoder (modo streamed)."""
+  profiled = False
+
+  def execute(self, input: dict, context: dict):
+    encoder = context.get("segment_encoder")
+    if encoder:
+      for clip in context.get("composites", []):
+        encoder.submit(clip)
+
+class SegmentEncoder:
+  """Codifica cada composite num arquivo intermediário assim que o canvas o emite.
+
+  Vídeo: h264 com os mesmos parâmetros para todos os segmentos (concat por stream copy).
+  Áudio: PCM s16le estéreo cortado na duração exata dos frames, para a trilha não escorregar entre segmentos.
+  """
+
+  def __init__(
+    self,
+    video_id: str,
+    profile: ExportProfile = None,
+    codec: str = "libx264",
+    max_workers: int = SEGMENT_ENCODER_WORKERS,
+    cancel_token: CancellationToken = None,
+  ):
+    # fps, escala e encoder saem do perfil: todos os segmentos iguais para o concat por stream copy
+    self.profile = profile or export_profile()
+    self.fps = self.profile.fps
+    self.codec = codec
+    self.preset = self.profile.preset or "medium"
+    self.cancel_token = cancel_token
+    self.work_dir = tempfile.mkdtemp(prefix=f"segments_{video_id}_")
+    self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="segment")
+    self.lock = threading.Lock()
+    # id(clip) -> (clip, future); o clip fica referenciado para o id não ser reaproveitado
+    self.segments: Dict[int, Tuple[object, Future]] = {}
+    self.background_music: Optional[Tuple[str, float]] = None
+    self.unregister = cancel_token.on_cancel(lambda: kill_writers(self.segment_paths())) if cancel_token else None
+
+  def submit(self, clip) -> Future:
+    with self.lock:
+      if id(clip) not in self.segments:
+        index = len(self.segments)
+        self.segments[id(clip)] = (clip, self.executor.submit(self.encode, clip, index))
+      return self.segments[id(clip)][1]
+
+  def segment_paths(self) -> List[str]:
+    with self.lock:
+      return [self.video_path(index) for index in range(len(self.segments))]
+
+  def video_path(self, index: int) -> str:
+    return os.path.join(self.work_dir, f"segment_{index:04d}.mp4")
+
+  def encode(self, clip, index: int) -> Tuple[str, str]:
+    frames = int(clip.duration * self.fps)
+    video_path = self.video_path(index)
+    write_frames(
+      self.profile.export_clip(clip), video_path, self.fps, 0, frames, self.codec, self.preset,
+      cancel_token=self.cancel_token, ffmpeg_params=self.profile.video_params(),
+    )
+
+    pcm_path = os.path.join(self.work_dir, f"segment_{index:04d}.pcm")
+    self.write_pcm(clip.audio, frames / self.fps, pcm_path)
+    return video_path, pcm_path
+
+  def write_pcm(self, audio, duration: float, path: str):
+    n_samples = int(round(duration * AUDIO_SAMPLE_RATE))
+    samples = np.zeros((n_samples, 2), dtype=np.int16)
+    if audio is not None:
+      sound = audio.with_duration(min(duration, audio.duration)).to_soundarray(fps=AUDIO_SAMPLE_RATE, quantize=True, nbytes=2)
+      if sound.ndim == 1 or sound.shape[1] == 1:
+        sound = np.repeat(sound.reshape(-1, 1), 2, axis=1)
+      n = min(n_samples, len(sound))
+      samples[:n] = sound[:n, :2]
+    with open(path, "wb") as f:
+      f.write(samples.tobytes())
+
+  def set_background_music(self, path: str, volume: float = 0.2):
+    self.background_music = (path, volume)
+
+  def finish(
+    self,
+    clips: list,
+    output_path: str,
+    audio_codec: str = "aac",
+    audio_bitrate: str = "128k",
+    on_progress: Callable[[float], None] = None,
+  ):
+    """Espera os segmentos da timeline (codificando os que não foram emitidos) e gera o vídeo final."""
+    futures = [self.submit(clip) for clip in clips]
+    results = []
+    for i, future in enumerate(futures, start=1):
+      results.append(future.result())
+      if on_progress:
+        on_progress(round(i / len(futures) * 100, 2))
+
+    if self.cancel_token:
+      self.cancel_token.raise_if_cancelled()
+
+    pcm_path = os.path.join(self.work_dir, "audio.pcm")
+    if self.background_music:
+      self.mix_music([segment_pcm for _, segment_pcm in results], pcm_path)
+    else:
+      with open(pcm_path, "wb") as out:
+        for _, segment_pcm in results:
+          with open(segment_pcm, "rb") as f:
+            shutil.copyfileobj(f, out)
+
+    mux_segments(
+      [video_path for video_path, _ in results], pcm_path, output_path, sample_rate=AUDIO_SAMPLE_RATE,
+      audio_codec=audio_codec, audio_bitrate=audio_bitrate,
+    )
+
+  def mix_music(self, segment_pcms: List[str], path: str):
+    """Narração dos segmentos + música pelo mesmo AudioMixer dos outros modos (loop, ganho e ducking)."""
+    music_path, music_volume = self.background_music
+    voice = np.concatenate([np.fromfile(pcm, dtype=np.int16).reshape(-1, 2) for pcm in segment_pcms])
+    mixer = AudioMixer(fps=AUDIO_SAMPLE_RATE)
+    mixer.add(voice.astype(np.float32) / 32767)
+    track = mixer.render(len(voice) / AUDIO_SAMPLE_RATE, music=load_music(music_path, mixer.fps), music_gain=music_volume)
+    (np.clip(track, -1, 1) * 32767).astype(np.int16).tofile(path)
+
+  def close(self):
+    if self.unregister:
+      self.unregister()
+    self.executor.shutdown(wait=True, cancel_futures=True)
+    shutil.rmtree(self.work_dir, ignore_errors=True)
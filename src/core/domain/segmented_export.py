@@ -0,0 +1,140 @@
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import numpy as np
+from typing import Callable, List, Optional, Tuple
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+from core.commons.ffmpeg import concat_segments, kill_writers
+from core.domain.cancellation import CancellationToken
+
+# single: um write_videofile só | segmented: chunks renderizados em paralelo e concatenados sem re-encode
+# streamed: cada composite é codificado em background assim que o canvas termina (segment_encoder.py)
+EXPORT_MODE = os.getenv("EXPORT_MODE", "single")
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", str(os.cpu_count() or 1)))
+
+# Timeline do processo do pool: cada processo (spawn) monta a sua na primeira chunk e a reusa nas seguintes
+_timeline = None
+
+def segment_boundaries(clips: list) -> List[float]:
+  """Instantes de corte naturais: o fim de cada composite na timeline concatenada."""
+  boundaries, t = [], 0.0
+  for clip in clips:
+    t += clip.duration
+    boundaries.append(t)
+  return boundaries
+
+def plan_chunks(boundaries: List[float], duration: float, fps: float, n_chunks: int) -> List[Tuple[int, int]]:
+  """Agrupa os segmentos em ~n_chunks intervalos [frame inicial, frame final) no grid de frames do export."""
+  total_frames = int(duration * fps)
+  cuts = sorted({min(total_frames, math.ceil(b * fps - 1e-6)) for b in boundaries} | {total_frames})
+  target = total_frames / max(1, n_chunks)
+
+  chunks, start = [], 0
+  for cut in cuts:
+    if cut > start and (cut - start >= target or cut == total_frames):
+      chunks.append((start, cut))
+      start = cut
+  return chunks
+
+def write_frames(
+  clip,
+  path: str,
+  fps: float,
+  start_frame: int,
+  end_frame: int,
+  codec: str = "libx264",
+  preset: str = "medium",
+  bitrate: Optional[str] = None,
+  cancel_token: CancellationToken = None,
+  ffmpeg_params: Optional[list] = None,
+) -> int:
+  """Mesmo loop do ffmpeg_write_video do moviepy, restrito a [start_frame, end_frame) e sem áudio."""
+  has_mask = clip.mask is not None
+  with FFMPEG_VideoWriter(path, clip.size, fps, codec=codec, preset=preset, bitrate=bitrate, with_mask=has_mask, ffmpeg_params=ffmpeg_params) as writer:
+    for frame_index in range(start_frame, end_frame):
+      if cancel_token:
+        cancel_token.raise_if_cancelled()
+      t = frame_index / fps
+      frame = clip.get_frame(t)
+      if frame.dtype != "uint8":
+        frame = frame.astype("uint8")
+      if has_mask:
+        mask = 255 * clip.mask.get_frame(t)
+        if mask.dtype != "uint8":
+          mask = mask.astype("uint8")
+        frame = np.dstack([frame, mask])
+      writer.write_frame(frame)
+  return end_frame - start_frame
+
+def render_chunk(build_clip: Callable, build_args: tuple, start_frame: int, end_frame: int, path: str, fps: float, codec: str, preset: str, bitrate: Optional[str], ffmpeg_params: Optional[list] = None) -> int:
+  global _timeline
+  if _timeline is None:
+    _timeline = build_clip(*build_args)
+  return write_frames(_timeline, path, fps, start_frame, end_frame, codec, preset, bitrate, ffmpeg_params=ffmpeg_params)
+
+def export_segmented(
+  clip,
+  build_clip: Callable,
+  build_args: tuple,
+  output_path: str,
+  boundaries: List[float],
+  fps: float,
+  codec: str = "libx264",
+  audio_codec: str = "aac",
+  audio_bitrate: str = "128k",
+  preset: str = "medium",
+  bitrate: Optional[str] = None,
+  ffmpeg_params: Optional[list] = None,
+  workers: int = EXPORT_WORKERS,
+  cancel_token: CancellationToken = None,
+  on_progress: Callable[[float], None] = None,
+):
+  """Renderiza a timeline em chunks paralelos, escreve o áudio uma vez e junta tudo com stream copy.
+
+  Os processos do pool são spawn (nada herdado do processo da API, que tem threads e readers abertos):
+  cada um reconstrói o clip com build_clip(*build_args), função de módulo e argumentos picklable.
+  """
+  chunks = plan_chunks(boundaries, clip.duration, fps, workers * 2)
+  work_dir = tempfile.mkdtemp(prefix="segments_", dir=os.path.dirname(os.path.abspath(output_path)))
+  chunk_paths = [os.path.join(work_dir, f"chunk_{i:04d}.mp4") for i in range(len(chunks))]
+  audio_path = os.path.join(work_dir, "audio.m4a") if clip.audio is not None else None
+  total_frames = sum(end - start for start, end in chunks)
+
+  pool = multiprocessing.get_context("spawn").Pool(processes=min(workers, len(chunks)))
+  unregister = cancel_token.on_cancel(lambda: kill_writers(chunk_paths + [audio_path or output_path])) if cancel_token else None
+  try:
+    results = [
+      pool.apply_async(render_chunk, (build_clip, build_args, start, end, path, fps, codec, preset, bitrate, ffmpeg_params))
+      for (start, end), path in zip(chunks, chunk_paths)
+    ]
+
+    # O áudio é escrito no processo pai enquanto os chunks são renderizados
+    if audio_path:
+      clip.audio.write_audiofile(audio_path, 44100, 4, 2000, audio_codec, bitrate=audio_bitrate, logger=None)
+
+    done_frames = 0
+    for result in results:
+      while not result.ready():
+        if cancel_token:
+          cancel_token.raise_if_cancelled()
+        result.wait(0.5)
+      done_frames += result.get()
+      if on_progress:
+        on_progress(round(done_frames / total_frames * 100, 2))
+
+    if cancel_token:
+      cancel_token.raise_if_cancelled()
+    concat_segments(chunk_paths, output_path, audio_path)
+  except Exception:
+    # Cancelado ou chunk com erro: não espera os demais chunks
+    pool.terminate()
+    kill_writers(chunk_paths)
+    raise
+  finally:
+    if unregister:
+      unregister()
+    pool.close()
+    pool.join()
+    shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,204 @@
+import bisect
+import os
+import threading
+import numpy as np
+from functools import lru_cache
+from typing import List, Tuple
+from moviepy import ColorClip, CompositeVideoClip, ImageClip, concatenate_videoclips
+from core.domain.compositor import NumpyCompositeClip, composite_class
+
+# Reaproveita o frame dos trechos estáticos da timeline em vez de recompor cada frame
+HOLD_STATIC_FRAMES = os.getenv("HOLD_STATIC_FRAMES", "true").lower() in ("1", "true", "yes")
+# Mescla as camadas estáticas do fundo de cada canvas numa imagem só, na montagem do canvas (composite_canvas)
+FLATTEN_STATIC_LAYERS = os.getenv("FLATTEN_STATIC_LAYERS", "true").lower() in ("1", "true", "yes")
+
+# Lambdas criadas pelo moviepy para posições fixas (VideoClip.__init__ e with_position com tupla)
+STATIC_POSITION_FUNCTIONS = {
+  "VideoClip.__init__.<locals>.<lambda>",
+  "VideoClip.with_position.<locals>.<lambda>",
+}
+
+Span = Tuple[float, float, bool]
+
+def has_static_position(clip) -> bool:
+  return getattr(clip.pos, "__qualname__", "") in STATIC_POSITION_FUNCTIONS
+
+@lru_cache(maxsize=1)
+def moviepy_internals_supported() -> bool:
+  """Confere (uma vez por processo) se o moviepy instalado ainda cria as lambdas de posição e a closure do
+  concatenate que este módulo reconhece. Se algo mudou, tudo passa a contar como animado (sem reaproveitar frames)."""
+  try:
+    first = ColorClip((2, 2), (0, 0, 0), duration=1)
+    second = ColorClip((2, 2), (255, 255, 255), duration=1)
+    chain = chained_clips(concatenate_videoclips([first, second]))
+    supported = (
+      has_static_position(first)
+      and has_static_position(first.with_position((0, 0)))
+      and not has_static_position(first.with_position(lambda t: (t, 0)))
+      and chain is not None
+      and chain[0] == [first, second]
+      and chain[1] == [0.0, 1.0, 2.0]
+    )
+  except Exception as e:
+    print(f"Falha ao inspecionar os clips do moviepy: {e}")
+    supported = False
+  if not supported:
+    print("⚠️ Internos do moviepy diferentes do esperado: trechos estáticos desligados, todo frame será composto")
+  return supported
+
+def frame_spans(clip) -> List[Span]:
+  """Divide [0, duration) do clip em trechos (início, fim, estático) no tempo local do clip.
+
+  Conservador: só ImageClip (imagem, texto, cor) é estático por natureza; um CompositeVideoClip é
+  estático onde todas as camadas tocando são estáticas e nenhuma entra ou sai. Qualquer outro clip
+  (frame_function própria, transform, efeitos) conta como animado.
+  """
+  # Sem duração (ex.: o bg criado pelo CompositeVideoClip): vale pelo tempo que o pai o usar
+  duration = clip.duration if clip.duration is not None else float("inf")
+  if not moviepy_internals_supported():
+    return [(0.0, duration, False)]
+  if isinstance(clip, ImageClip):
+    return [(0.0, duration, clip.mask is None or all(static for _, _, static in frame_spans(clip.mask)))]
+  chain = chained_clips(clip)
+  if chain is not None:
+    clips, timings = chain
+    return [
+      (timings[i] + s, min(timings[i] + e, timings[i + 1]), static)
+      for i, child in enumerate(clips)
+      for s, e, static in frame_spans(child)
+      if timings[i] + s < timings[i + 1]
+    ]
+  if type(clip) not in (CompositeVideoClip, NumpyCompositeClip) or "frame_function" in clip.__dict__:
+    # frame_function sobrescrita (subclipped, transform...): os filhos não descrevem mais o frame
+    return [(0.0, duration, False)]
+
+  layers = [clip.bg] + list(clip.clips)
+  cuts = {0.0, duration}
+  layer_spans = []
+  for layer in layers:
+    start = layer.start or 0.0
+    end = min(layer.end if layer.end is not None else duration, duration)
+    spans = [(start + s, start + e, static) for s, e, static in layer_spans_of(layer, end - start)]
+    layer_spans.append((start, end, spans))
+    cuts.update(t for t in (start, end) if 0.0 <= t <= duration)
+    cuts.update(t for s, e, _ in spans for t in (s, e) if 0.0 <= t <= duration)
+
+  points = sorted(cuts)
+  result = []
+  for a, b in zip(points, points[1:]):
+    if b <= a:
+      continue
+    static = all(
+      layer_static_between(spans, a, b)
+      for start, end, spans in layer_spans
+      if start < b and end > a
+    )
+    result.append((a, b, static))
+  return result
+
+def chained_clips(clip):
+  """Clips e tempos de um concatenate_videoclips(method="chain") (ex.: os blocos da legenda), lidos da closure."""
+  func = clip.__dict__.get("frame_function")
+  if getattr(func, "__qualname__", "") != "concatenate_videoclips.<locals>.frame_function":
+    return None
+  cells = dict(zip(func.__code__.co_freevars, func.__closure__ or ()))
+  if "clips" not in cells or "timings" not in cells:
+    return None
+  clips, timings = cells["clips"].cell_contents, cells["timings"].cell_contents
+  # Formato esperado: a lista dos clips e os instantes de início de cada um mais o fim
+  if not isinstance(clips, list) or len(timings) != len(clips) + 1:
+    return None
+  return clips, [float(t) for t in timings]
+
+def layer_spans_of(layer, duration: float) -> List[Span]:
+  """Trechos de uma camada dentro do composite: conteúdo, máscara e posição precisam ser estáticos."""
+  if not has_static_position(layer):
+    return [(0.0, duration, False)]
+  spans = frame_spans(layer)
+  if layer.mask is not None and not isinstance(layer, ImageClip):
+    spans = intersect_spans(spans, frame_spans(layer.mask))
+  return [(s, min(e, duration), static) for s, e, static in spans if s < duration]
+
+def intersect_spans(first: List[Span], second: List[Span]) -> List[Span]:
+  points = sorted({t for s, e, _ in first + second for t in (s, e)})
+  return [
+    (a, b, layer_static_between(first, a, b) and layer_static_between(second, a, b))
+    for a, b in zip(points, points[1:]) if b > a
+  ]
+
+def layer_static_between(spans: List[Span], a: float, b: float) -> bool:
+  # [a, b) precisa estar contido num único trecho estático (a troca de trecho muda o frame)
+  return any(static and s <= a and b <= e for s, e, static in spans)
+
+def hold_static_frames(clip, source=None):
+  """Copia do clip que reaproveita o frame de cada trecho estático (o frame é calculado uma vez por trecho).
+
+  source: clip de onde saem os trechos quando clip é uma transformação dele que preserva o tempo (ex.: resized).
+  """
+  if not HOLD_STATIC_FRAMES:
+    return clip
+  source = source if source is not None else clip
+  spans = [(s, e) for s, e, static in frame_spans(source) if static]
+  if not spans:
+    return clip
+
+  starts = [s for s, _ in spans]
+  cache = {"span": None, "frame": None}
+  lock = threading.Lock()
+  get_frame = clip.get_frame
+
+  def frame_function(t):
+    index = bisect.bisect_right(starts, t) - 1
+    if index < 0 or t >= spans[index][1]:
+      return get_frame(t)
+    with lock:
+      if cache["span"] != index:
+        # Cópia: o clip pode reaproveitar o buffer do frame (NumpyCompositeClip) fora do trecho
+        cache["frame"] = np.array(get_frame(t))
+        cache["span"] = index
+      return cache["frame"]
+
+  held = clip.with_updated_frame_function(frame_function)
+  if clip.mask is not None:
+    held.mask = hold_static_frames(clip.mask, source=source.mask)
+  return held
+
+def static_ratio(clip) -> float:
+  if not clip.duration:
+    return 0.0
+  return sum(e - s for s, e, static in frame_spans(clip) if static) / clip.duration
+
+def is_static_layer(layer, duration: float) -> bool:
+  """Camada que cobre o composite inteiro sem mudar (conteúdo, máscara e posição)."""
+  start = layer.start or 0.0
+  end = layer.end if layer.end is not None else float("inf")
+  if start > 0 or end < duration or layer.audio is not None:
+    return False
+  return layer_static_between(layer_spans_of(layer, duration), 0.0, duration)
+
+def composite_canvas(clips: list, size=None, compositor: str = None) -> CompositeVideoClip:
+  """CompositeVideoClip com as camadas estáticas do fundo já mescladas numa imagem só.
+
+  As camadas abaixo da primeira animada são compostas uma vez aqui; a cada frame o moviepy só
+  cola as camadas animadas sobre essa imagem (e, se ela for opaca, nem calcula a máscara).
+  """
+  clips = sorted(clips, key=lambda clip: clip.layer_index)
+  size = size or clips[0].size
+  ends = [clip.end for clip in clips]
+  if not FLATTEN_STATIC_LAYERS or None in ends:
+    return CompositeVideoClip(clips, size=size)
+
+  duration = max(ends)
+  n_static = 0
+  while n_static < len(clips) - 1 and is_static_layer(clips[n_static], duration):
+    n_static += 1
+  if n_static == 0:
+    return CompositeVideoClip(clips, size=size)
+
+  flattened = CompositeVideoClip(clips[:n_static], size=size)
+  background = ImageClip(flattened.get_frame(0)).with_duration(duration)
+  mask = flattened.mask.get_frame(0) if flattened.mask is not None else None
+  if mask is not None and mask.min() < 1.0:
+    background = background.with_mask(ImageClip(mask, is_mask=True).with_duration(duration))
+  # Com o fundo opaco já mesclado, o compositor numpy só cola as camadas animadas
+  return composite_class(compositor)([background] + clips[n_static:], size=size, use_bgclip=True)
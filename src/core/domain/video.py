@@ -1,17 +1,39 @@
+import errno
 import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import numpy as np
+from core.commons.ffmpeg import kill_writers, split_scale_filter, transcode_renditions
+from core.domain.audio_mixer import AudioMixer, load_music
+from core.domain.cancellation import PipelineCancelled
+from core.domain.export_profile import EXPORT_CRF, EXPORT_PRESET, EXPORT_THREADS, ExportProfile, export_profile, rendition_path, renditions
 from core.domain.pipeline import Step
 from core.domain.progress_manager import progress_manager
-from moviepy import concatenate_videoclips, AudioFileClip, VideoClip, CompositeAudioClip, concatenate_audioclips
+from core.domain.segmented_export import EXPORT_MODE, export_segmented, segment_boundaries
+from core.domain.static_spans import static_ratio
+from moviepy import concatenate_videoclips, VideoClip
+from moviepy.config import FFMPEG_BINARY
+from moviepy.audio.AudioClip import AudioArrayClip
 from proglog import ProgressBarLogger
-from typing import Callable
+from typing import Callable, List, Optional, Tuple
+
+AUDIO_SAMPLE_RATE = 44100
 
 
 class CustomProgressLogger(ProgressBarLogger):
-  def __init__(self, video_id: str):
+  def __init__(self, video_id: str, cancel_token=None):
     super().__init__()
     self.video_id = video_id
+    self.cancel_token = cancel_token
 
   def bars_callback(self, bar, attr, value, old_value=None):
+    # Chamado a cada frame/chunk do export: ponto de parada do job cancelado (fora do try, para propagar)
+    if self.cancel_token:
+      self.cancel_token.raise_if_cancelled()
     try:
       total = self.bars[bar].get("total", 1)
       percent = round((value / total) * 100, 2)
@@ -31,6 +53,210 @@ class CustomProgressLogger(ProgressBarLogger):
 
 
 
+class FFmpegPipeWriter:
+  """Um processo ffmpeg por export: frames RGB crus no stdin e o áudio PCM s16le por uma fifo, escrita em paralelo.
+
+  Os frames vão como memoryview do array uint8 contíguo, sem cópias intermediárias no caminho até o pipe.
+  renditions: saídas extras (caminho, tamanho, bitrate, bitrate do áudio) codificadas dos mesmos frames.
+  """
+
+  def __init__(
+    self,
+    output_path: str,
+    size,
+    fps: float,
+    codec: str = "libx264",
+    preset: Optional[str] = EXPORT_PRESET,
+    crf: Optional[str] = EXPORT_CRF,
+    threads: Optional[str] = EXPORT_THREADS,
+    bitrate: Optional[str] = None,
+    audio_codec: str = "aac",
+    audio_bitrate: str = "128k",
+    scale: Optional[Tuple[int, int]] = None,
+    renditions: Optional[List[Tuple[str, Tuple[int, int], str, str]]] = None,
+    with_audio: bool = True,
+  ):
+    self.output_path = output_path
+    self.width, self.height = size
+    self.fps = fps
+    self.codec = codec
+    self.preset = preset
+    self.crf = crf
+    self.threads = threads
+    self.bitrate = bitrate
+    self.audio_codec = audio_codec
+    self.audio_bitrate = audio_bitrate
+    # Tamanho de saída quando diferente do frame (o ffmpeg reduz, os frames chegam no tamanho do canvas)
+    self.scale = scale
+    self.renditions = renditions or []
+    self.with_audio = with_audio
+    self.proc = None
+    self.work_dir = None
+    self.audio_thread = None
+    self.audio_error = None
+    self.stderr = None
+
+  def command(self, fifo_path: Optional[str]) -> list:
+    cmd = [
+      FFMPEG_BINARY, "-y", "-loglevel", "error",
+      "-f", "rawvideo", "-vcodec", "rawvideo", "-s", f"{self.width}x{self.height}",
+      "-pix_fmt", "rgb24", "-r", str(self.fps), "-i", "-",
+    ]
+    if fifo_path:
+      cmd += ["-f", "s16le", "-ar", str(AUDIO_SAMPLE_RATE), "-ac", "2", "-i", fifo_path]
+    size = tuple(self.scale) if self.scale else (self.width, self.height)
+    if self.renditions:
+      # Um único render alimenta todas as saídas: split dos frames e um scale por saída
+      graph, labels = split_scale_filter("0:v", [size] + [rendition_size for _, rendition_size, _, _ in self.renditions])
+      cmd += ["-filter_complex", graph]
+    else:
+      labels = ["0:v"]
+      if size != (self.width, self.height):
+        cmd += ["-vf", f"scale={size[0]}:{size[1]}"]
+
+    outputs = [(self.output_path, self.crf, self.bitrate, self.audio_bitrate)]
+    outputs += [(path, None, bitrate, audio_bitrate) for path, _, bitrate, audio_bitrate in self.renditions]
+    for (path, crf, bitrate, audio_bitrate), label in zip(outputs, labels):
+      cmd += ["-map", label] + (["-map", "1:a"] if fifo_path else [])
+      cmd += ["-c:v", self.codec, "-pix_fmt", "yuv420p"]
+      if self.preset:
+        cmd += ["-preset", self.preset]
+      if crf:
+        cmd += ["-crf", str(crf)]
+      if bitrate:
+        cmd += ["-b:v", bitrate]
+      if self.threads:
+        cmd += ["-threads", str(self.threads)]
+      if fifo_path:
+        cmd += ["-c:a", self.audio_codec, "-b:a", audio_bitrate]
+      cmd += ["-movflags", "+faststart", path]
+    return cmd
+
+  def open(self, audio_chunks=None):
+    """Sobe o ffmpeg; audio_chunks (iterável de arrays int16 estéreo) é escrito na fifo por uma thread."""
+    fifo_path = None
+    if self.with_audio and audio_chunks is not None:
+      self.work_dir = tempfile.mkdtemp(prefix="export_")
+      fifo_path = os.path.join(self.work_dir, "audio.pcm")
+      os.mkfifo(fifo_path)
+    self.stderr = tempfile.TemporaryFile()
+    self.proc = subprocess.Popen(self.command(fifo_path), stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self.stderr)
+    if fifo_path:
+      self.audio_thread = threading.Thread(target=self.write_audio, args=(fifo_path, audio_chunks), name="export-audio", daemon=True)
+      self.audio_thread.start()
+    return self
+
+  def write_audio(self, fifo_path: str, audio_chunks):
+    try:
+      fifo = self.open_fifo(fifo_path)
+      if fifo is None:
+        return
+      with fifo:
+        for chunk in audio_chunks:
+          fifo.write(memoryview(np.ascontiguousarray(chunk, dtype=np.int16)).cast("B"))
+    except (BrokenPipeError, OSError) as e:
+      # ffmpeg morreu ou foi morto (cancelamento): o erro real aparece no close
+      self.audio_error = e
+
+  def open_fifo(self, fifo_path: str):
+    # Abre sem bloquear: se o ffmpeg morrer antes de abrir a fifo, a thread não fica presa no open
+    while True:
+      try:
+        fd = os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+      except OSError as e:
+        if e.errno != errno.ENXIO:
+          raise
+        if self.proc.poll() is not None:
+          return None
+        time.sleep(0.01)
+        continue
+      os.set_blocking(fd, True)
+      return os.fdopen(fd, "wb")
+
+  def write_frame(self, frame: np.ndarray):
+    if frame.dtype != np.uint8:
+      frame = frame.astype(np.uint8)
+    frame = np.ascontiguousarray(frame[:, :, :3])
+    try:
+      self.proc.stdin.write(memoryview(frame).cast("B"))
+    except BrokenPipeError:
+      raise IOError(f"ffmpeg encerrou durante o export de {self.output_path}: {self.read_stderr()}")
+
+  def read_stderr(self) -> str:
+    self.stderr.seek(0)
+    return self.stderr.read().decode(errors="ignore").strip()
+
+  def close(self):
+    if self.proc is None:
+      return
+    try:
+      try:
+        self.proc.stdin.close()
+      except BrokenPipeError:
+        pass
+      if self.audio_thread:
+        self.audio_thread.join()
+      if self.proc.wait() != 0:
+        raise IOError(f"ffmpeg falhou no export de {self.output_path}: {self.read_stderr()}")
+    finally:
+      self.proc = None
+      self.stderr.close()
+      if self.work_dir:
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+  def kill(self):
+    if self.proc is not None and self.proc.poll() is None:
+      self.proc.kill()
+
+def audio_chunks(audio, duration: float, chunk_seconds: float = 5.0):
+  """PCM s16le estéreo do áudio do clip, em blocos, cortado na duração do vídeo."""
+  total = int(round(duration * AUDIO_SAMPLE_RATE))
+  step = int(chunk_seconds * AUDIO_SAMPLE_RATE)
+  for start in range(0, total, step):
+    tt = np.arange(start, min(start + step, total)) / AUDIO_SAMPLE_RATE
+    chunk = audio.to_soundarray(tt=tt, fps=AUDIO_SAMPLE_RATE, quantize=True, nbytes=2)
+    if chunk.ndim == 1 or chunk.shape[1] == 1:
+      chunk = np.repeat(chunk.reshape(-1, 1), 2, axis=1)
+    yield chunk[:, :2]
+
+def write_video_piped(
+  clip,
+  output_path: str,
+  fps: float,
+  options: dict = None,
+  cancel_token=None,
+  on_progress: Callable[[float], None] = None,
+):
+  """Export single: cada frame do clip vai direto para o stdin do ffmpeg, o áudio em paralelo pela fifo."""
+  options = options or {}
+  audio = clip.audio
+  writer = FFmpegPipeWriter(output_path, clip.size, fps, with_audio=audio is not None, **options)
+  unregister = cancel_token.on_cancel(writer.kill) if cancel_token else None
+  n_frames = int(clip.duration * fps)
+  try:
+    # O áudio vai até o fim do vídeo ou da trilha, o que vier antes
+    writer.open(audio_chunks(audio, min(clip.duration, audio.duration or clip.duration)) if audio is not None else None)
+    last_percent = -1
+    for frame_index in range(n_frames):
+      if cancel_token:
+        cancel_token.raise_if_cancelled()
+      writer.write_frame(clip.get_frame(frame_index / fps))
+      percent = int((frame_index + 1) / n_frames * 100)
+      if on_progress and percent != last_percent:
+        on_progress(percent)
+        last_percent = percent
+    writer.close()
+  except BaseException:
+    writer.kill()
+    try:
+      writer.close()
+    except Exception:
+      pass
+    raise
+  finally:
+    if unregister:
+      unregister()
+
 class ConcatenateVideoStep(Step):
   def __init__(self, name: str, description: str, input_transformer: Callable[[dict], dict] = None):
     super().__init__(name, description, input_transformer)
@@ -49,15 +275,131 @@ class ExportVideo(Step):
     final_video = input["final_video"]
     output_path = input.get("output_path", "output.mp4")
     video_id = context.get("id")
+    profile = export_profile(input.get("export_profile") or context.get("export_profile"))
+    width, height = profile.output_size(final_video.size)
+    print(f"🎚️ Perfil de export {profile.name}: {width}x{height}, {profile.fps} fps, preset {profile.preset or 'padrão'}")
+    selected = self.select_renditions(input, context, (width, height))
+    # (caminho, tamanho, bitrate, bitrate do áudio) de cada rendition, gravada junto do vídeo principal
+    outputs = [(rendition_path(output_path, r.name), r.size, r.bitrate, r.audio_bitrate) for r in selected]
+    rendition_paths = [path for path, _, _, _ in outputs]
 
-    logger = CustomProgressLogger(video_id)
-    final_video.write_videofile(output_path, fps=10, logger=logger, codec="libx264", audio_codec="aac", audio_bitrate="128k")
+    cancel_token = context.get("cancel_token")
+    # Áudio temporário com nome conhecido, para ser apagado se o export for cancelado
+    temp_audiofile = os.path.splitext(output_path)[0] + "_TEMP_audio.m4a"
+
+    logger = CustomProgressLogger(video_id, cancel_token)
+    unregister = cancel_token.on_cancel(lambda: kill_writers([output_path, temp_audiofile] + rendition_paths)) if cancel_token else None
+    try:
+      if not context.get("segment_encoder"):
+        # Trechos sem nada animando (ex.: pausas entre perguntas) são compostos uma vez só
+        print(f"🧊 {static_ratio(final_video):.0%} da timeline é estática")
+        final_video = profile.export_clip(final_video)
+      if context.get("segment_encoder"):
+        # Os segmentos já foram codificados durante a pipeline: só falta concatenar e mixar a música
+        context["segment_encoder"].finish(
+          context["composites"], output_path, audio_codec="aac", audio_bitrate=profile.audio_bitrate,
+          on_progress=lambda percent: self.publish_progress(video_id, percent)
+        )
+      elif self.use_segmented(input, context):
+        export_segmented(
+          final_video, rebuild_final_video, (context["request"],), output_path, segment_boundaries(context["composites"]), fps=profile.fps,
+          codec="libx264", audio_codec="aac", audio_bitrate=profile.audio_bitrate,
+          preset=profile.preset or "medium", ffmpeg_params=profile.video_params(),
+          cancel_token=cancel_token, on_progress=lambda percent: self.publish_progress(video_id, percent)
+        )
+      elif hasattr(os, "mkfifo"):
+        # As renditions saem do mesmo processo ffmpeg, dos mesmos frames
+        write_video_piped(
+          final_video, output_path, fps=profile.fps,
+          options={**self.encoder_options(input, profile), "renditions": outputs},
+          cancel_token=cancel_token, on_progress=lambda percent: self.publish_progress(video_id, percent)
+        )
+        outputs = []
+      else:
+        # Sem fifo (Windows): caminho do moviepy, com áudio temporário em disco
+        final_video.write_videofile(
+          output_path, fps=profile.fps, logger=logger, codec="libx264", preset=profile.preset or "medium",
+          audio_codec="aac", audio_bitrate=profile.audio_bitrate, temp_audiofile=temp_audiofile,
+          ffmpeg_params=profile.video_params(),
+        )
+      if outputs:
+        # Nos outros modos o vídeo principal já está pronto: é decodificado uma vez e vira todas as renditions
+        transcode_renditions(output_path, outputs, preset=profile.preset or "medium")
+    except Exception as e:
+      if cancel_token and cancel_token.cancelled:
+        for path in [output_path, temp_audiofile] + rendition_paths:
+          if os.path.exists(path):
+            os.remove(path)
+        raise PipelineCancelled("Export cancelled") from e
+      raise
+    finally:
+      if unregister:
+        unregister()
     progress_manager.publish(video_id, json.dumps({
       "event": "video_ready",
-      "video_id": video_id
+      "video_id": video_id,
+      "renditions": [r.name for r in selected]
+    }))
+
+  def select_renditions(self, input: dict, context: dict, size):
+    """Renditions do input do step, do pedido ou de EXPORT_RENDITIONS; as maiores que o vídeo principal ficam de fora."""
+    selected = []
+    for rendition in renditions(input.get("renditions", context.get("renditions"))):
+      if rendition.width > size[0] or rendition.height > size[1]:
+        print(f"⏭️ Rendition {rendition.name} ignorada: maior que o export ({size[0]}x{size[1]})")
+        continue
+      selected.append(rendition)
+    return selected
+
+  def encoder_options(self, input: dict, profile: ExportProfile) -> dict:
+    """Encoder do export: o do perfil, com preset, crf, threads e bitrate sobrescrevíveis pelo input do step."""
+    options = {
+      "codec": "libx264", "audio_codec": "aac", "audio_bitrate": profile.audio_bitrate,
+      "preset": profile.preset, "crf": profile.crf,
+    }
+    for key in ("preset", "crf", "threads", "bitrate"):
+      if input.get(key) is not None:
+        options[key] = input[key]
+    return options
+
+  def use_segmented(self, input: dict, context: dict) -> bool:
+    # Os composites são os pontos de corte; com um só não há o que paralelizar.
+    # Sem o pedido no contexto os processos do export não conseguem reconstruir a timeline
+    mode = input.get("export_mode", EXPORT_MODE)
+    return mode == "segmented" and len(context.get("composites", [])) > 1 and context.get("request") is not None
+
+  def publish_progress(self, video_id: str, percent: float):
+    progress_manager.publish(video_id, json.dumps({
+      "event": "export_progress",
+      "video_id": video_id,
+      "step": "frame_index",
+      "progress": percent
     }))
 
 
+def rebuild_final_video(request: dict):
+  """Nos processos do export segmentado: refaz a pipeline do pedido até o ExportVideo e retorna o clip que ele exportaria.
+
+  Roda em modo replay: os steps caros (roteiro, TTS, imagens) só voltam dos checkpoints do render original,
+  sem métricas e sem a mixagem da música (as chunks não têm áudio).
+  """
+  # Import tardio: a fábrica importa os builders, que importam este módulo
+  from core.config.pipeline_factory import pipeline_factory
+  from core.domain.render_executor import create_context
+
+  pipeline = pipeline_factory.create(request["pipeline"])
+  context = create_context(request["id"], request, None)
+  context["step_hooks"] = []
+  context["replay"] = True
+  for step in pipeline.steps:
+    if isinstance(step, ExportVideo):
+      input = step.prepare(context)
+      profile = export_profile(input.get("export_profile") or context.get("export_profile"))
+      return profile.export_clip(input["final_video"])
+    step.run(context)
+  raise RuntimeError(f"Pipeline {request['pipeline']} não tem um step ExportVideo")
+
+
 class AddBackgroundMusicStep(Step):
   def __init__(self, name: str, description: str, input_transformer: Callable[[dict], dict] = None):
     super().__init__(name, description, input_transformer)
@@ -66,15 +408,23 @@ class AddBackgroundMusicStep(Step):
     final_video = input["final_video"]
     background_music_path = input["background_music_path"]
 
-    music_clip = AudioFileClip(background_music_path)
-    n_loops = int(final_video.duration // music_clip.duration) + 1
-    repeated_music = concatenate_audioclips([music_clip] * n_loops)
-    repeated_music = repeated_music.with_duration(final_video.duration)
+    if context.get("replay"):
+      # Reconstrução da timeline para o export segmentado: só os frames importam
+      context[self.name] = {"final_video": final_video}
+      return
 
+    encoder = context.get("segment_encoder")
+    if encoder:
+      # No modo streamed a música é mixada no finish do encoder, sobre a narração dos segmentos
+      encoder.set_background_music(background_music_path, 0.2)
+      context[self.name] = {"final_video": final_video}
+      return
+
+    # Narração, efeitos e música decodificados uma vez e mixados num array só: o export só grava a trilha pronta
+    mixer = AudioMixer()
     if final_video.audio:
-      final_audio = CompositeAudioClip([final_video.audio, repeated_music.with_volume_scaled(0.2)])
-    else:
-      final_audio = repeated_music
+      mixer.add_clip(final_video.audio)
+    track = mixer.render(final_video.duration, music=load_music(background_music_path, mixer.fps), music_gain=0.2)
 
-    final_video = final_video.with_audio(final_audio)
-    context[self.name] = {"final_video": final_video}
\ No newline at end of file
+    final_video = final_video.with_audio(AudioArrayClip(track, fps=mixer.fps))
+    context[self.name] = {"final_video": final_video}
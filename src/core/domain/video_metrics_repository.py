@@ -1,5 +1,6 @@
 # src/core/domain/video_metrics_repository.py
 from core.commons.mongo import db
+from pymongo import UpdateOne
 from typing import Dict, Any, List
 
 class VideoMetricsRepository:
@@ -13,6 +14,22 @@ class VideoMetricsRepository:
             upsert=True
         )
 
+    async def append_steps(self, video_id: str, steps: List[Dict[str, Any]]):
+        await self.collection.update_one(
+            {"id": video_id},
+            {"$push": {"steps": {"$each": steps}}},
+            upsert=True
+        )
+
+    async def bulk_append_steps(self, steps_by_video: Dict[str, List[Dict[str, Any]]]):
+        operations = [
+            UpdateOne({"id": video_id}, {"$push": {"steps": {"$each": steps}}}, upsert=True)
+            for video_id, steps in steps_by_video.items()
+            if steps
+        ]
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
     async def get(self, video_id: str):
         return await self.collection.find_one({"id": video_id})
 
@@ -1,9 +1,12 @@
+import time
+from pymongo import ReturnDocument
 from core.commons.mongo import db
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 class VideoRequestRepository:
-    def __init__(self):
-        self.collection = db["video_requests"]
+    def __init__(self, collection=None):
+        # collection injetável: outro banco do motor ou, sem Mongo, AsyncCollection(mongomock) de core.commons.mongo
+        self.collection = collection if collection is not None else db["video_requests"]
 
     async def create(self, data: Dict[str, Any]):
         await self.collection.insert_one(data)
@@ -11,8 +14,131 @@ class VideoRequestRepository:
     async def update_status(self, video_id: str, status: str):
         await self.collection.update_one({"id": video_id}, {"$set": {"status": status}})
 
+    async def transition(self, video_id: str, status: str, from_statuses: List[str]) -> bool:
+        """Muda o status só se o atual for um dos esperados (ex.: não sobrescrever um "cancelled")."""
+        result = await self.collection.update_one(
+            {"id": video_id, "status": {"$in": from_statuses}},
+            {"$set": {"status": status}}
+        )
+        return result.modified_count == 1
+
     async def update(self, video_id: str, update_data: Dict[str, Any]):
         await self.collection.update_one({"id": video_id}, {"$set": update_data})
 
     async def get(self, video_id: str):
-        return await self.collection.find_one({"id": video_id}) 
\ No newline at end of file
+        return await self.collection.find_one({"id": video_id}) 
+
+    async def find_by_status(self, status: str) -> List[Dict[str, Any]]:
+        cursor = self.collection.find({"status": status})
+        return await cursor.to_list(length=None)
+
+    async def ids_with_status(self, video_ids: List[str], status: str) -> List[str]:
+        """Quais dos ids estão com o status (ex.: jobs deste processo cancelados por outro processo da API)."""
+        cursor = self.collection.find({"id": {"$in": video_ids}, "status": status}, {"id": 1})
+        return [doc["id"] for doc in await cursor.to_list(length=None)]
+
+    async def ids_in_statuses(self, statuses: List[str]) -> List[str]:
+        """Ids de todos os vídeos com algum dos status (ex.: na fila ou renderizando, em qualquer processo)."""
+        cursor = self.collection.find({"status": {"$in": statuses}}, {"id": 1})
+        return [doc["id"] for doc in await cursor.to_list(length=None)]
+
+    async def count_by_status(self, status: str) -> int:
+        return await self.collection.count_documents({"status": status})
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("id")
+        await self.collection.create_index([("status", 1), ("priority", -1), ("queued_at", 1)])
+
+    # Leasing: as datas são epoch em segundos (float) para o doc continuar serializável em JSON na API
+
+    async def claim_next_queued(self, owner: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """Tira da fila o próximo job (maior prioridade, depois o mais antigo) com find-and-modify atômico.
+
+        O job sai com o lease do processo que vai renderizá-lo; se ele morrer, requeue_expired devolve o job à fila.
+        """
+        now = time.time()
+        return await self.collection.find_one_and_update(
+            {"status": "queued"},
+            {
+                "$set": {
+                    "status": "pending",
+                    "queue_position": None,
+                    "lease_owner": owner,
+                    "lease_expires_at": now + lease_seconds,
+                    "claimed_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", -1), ("queued_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def count_leased(self) -> int:
+        """Jobs despachados com lease vivo, em qualquer processo (não conta os "pending" ainda fora da fila)."""
+        return await self.collection.count_documents(
+            {"status": {"$in": ["pending", "processing"]}, "lease_expires_at": {"$gte": time.time()}}
+        )
+
+    async def drop_lease(self, video_id: str, owner: str):
+        """Tira o lease ao fim do job; o status final já foi gravado pela pipeline (ou pelo DELETE)."""
+        await self.collection.update_one(
+            {"id": video_id, "lease_owner": owner},
+            {"$unset": {"lease_owner": "", "lease_expires_at": ""}}
+        )
+
+    async def requeue_expired(self, max_attempts: int) -> int:
+        """Devolve à fila os jobs cujo processo parou de renovar o lease (ainda abaixo do limite de tentativas)."""
+        result = await self.collection.update_many(
+            {"status": {"$in": ["pending", "processing"]}, "lease_expires_at": {"$lt": time.time()}, "attempts": {"$lt": max_attempts}},
+            {"$set": {"status": "queued"}, "$unset": {"lease_owner": "", "lease_expires_at": ""}}
+        )
+        return result.modified_count
+
+    async def queued_in_order(self) -> List[Dict[str, Any]]:
+        cursor = self.collection.find({"status": "queued"}, {"id": 1, "queue_position": 1, "queued_at": 1}).sort([("priority", -1), ("queued_at", 1)])
+        return await cursor.to_list(length=None)
+
+    async def claim_next(self, worker_id: str, lease_seconds: float, max_attempts: int) -> Optional[Dict[str, Any]]:
+        """Pega o próximo job da fila (ou um cujo lease expirou) com find-and-modify atômico."""
+        now = time.time()
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "queued"},
+                {"status": "processing", "lease_expires_at": {"$lt": now}, "attempts": {"$lt": max_attempts}},
+            ]},
+            {
+                "$set": {
+                    "status": "processing",
+                    "queue_position": None,
+                    "lease_owner": worker_id,
+                    "lease_expires_at": now + lease_seconds,
+                    "claimed_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", -1), ("queued_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def renew_lease(self, video_id: str, worker_id: str, lease_seconds: float) -> bool:
+        result = await self.collection.update_one(
+            {"id": video_id, "status": {"$in": ["pending", "processing"]}, "lease_owner": worker_id},
+            {"$set": {"lease_expires_at": time.time() + lease_seconds}}
+        )
+        return result.matched_count == 1
+
+    async def release(self, video_id: str, worker_id: str, status: str) -> bool:
+        """Finaliza o lease; não faz nada se o job já foi retomado por outro worker ou cancelado pela API."""
+        result = await self.collection.update_one(
+            {"id": video_id, "lease_owner": worker_id, "status": "processing"},
+            {"$set": {"status": status}, "$unset": {"lease_owner": "", "lease_expires_at": ""}}
+        )
+        return result.matched_count == 1
+
+    async def fail_expired(self, max_attempts: int) -> int:
+        """Marca como failed os jobs que estouraram o lease já no limite de tentativas."""
+        result = await self.collection.update_many(
+            {"status": {"$in": ["pending", "processing"]}, "lease_expires_at": {"$lt": time.time()}, "attempts": {"$gte": max_attempts}},
+            {"$set": {"status": "failed"}, "$unset": {"lease_owner": "", "lease_expires_at": ""}}
+        )
+        return result.modified_count
@@ -5,6 +5,8 @@ from typing import Callable
 
 
 class GenerateFunFactInputStep(Step):
+    checkpointable = True
+
     def __init__(
         self,
         name: str,
@@ -1,8 +1,13 @@
 from moviepy import vfx
+import numpy as np
+from core.commons.asset_cache import asset_cache
 from core.commons.font import get_valid_font_path
 from core.commons.image import add_rounded_border_to_image_clip
+from core.commons.text_cache import text_cache
 from core.domain.pipeline import Step
-from moviepy.video.VideoClip import ImageClip, TextClip
+from core.domain.segment_encoder import emit_composites
+from core.domain.static_spans import composite_canvas
+from moviepy.video.VideoClip import ImageClip
 from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
 from typing import Callable
 import os
@@ -22,8 +27,7 @@ class GenerateFunFactCanvas(Step):
         audio_clip = input["audio_clip"]
 
         background = (
-            ImageClip(input["background_path"])
-            .resized((1080, 1920))
+            asset_cache.image_clip(input["background_path"], new_size=(1080, 1920))
             .with_duration(typing_clip.duration)
         )
 
@@ -33,7 +37,7 @@ class GenerateFunFactCanvas(Step):
             .with_duration(typing_clip.duration)
         )
 
-        title_clip = TextClip(
+        title_clip = text_cache.text_clip(
             text=title_text,
             font_size=80,
             size=(880, 350),
@@ -51,7 +55,8 @@ class GenerateFunFactCanvas(Step):
 
         caption_clip = typing_clip.with_position(("center", 1385))
 
-        clips = [background, title_clip, img_with_border, caption_clip]
+        # Só a legenda anima: ela fica por último para as camadas fixas serem mescladas num fundo só
+        clips = [background, title_clip, img_with_border]
         
         country_code = input.get("country_code")
         
@@ -59,8 +64,7 @@ class GenerateFunFactCanvas(Step):
             flag_path = f"src/countries_fun_facts/assets/flags/{country_code}.png"
             if os.path.exists(flag_path):
                 flag_clip = (
-                    ImageClip(flag_path)
-                    .resized(width=200)
+                    asset_cache.image_clip(flag_path, width=200)
                     .with_duration(typing_clip.duration)
                     .with_position(("center", 100))  # canto superior direito
                 )
@@ -68,12 +72,14 @@ class GenerateFunFactCanvas(Step):
             else:
                 print(f"Warning: Flag image not found for {country_code} at {flag_path}")
 
+        clips.append(caption_clip)
+
         # Primeiro composite sem freeze frame
-        composite = CompositeVideoClip(clips)
+        composite = composite_canvas(clips, compositor=input.get("compositor"))
         composite.audio = audio_clip
 
         # Criar freeze frame baseado no último frame
-        last_frame = composite.get_frame(composite.duration - 0.05)
+        last_frame = np.array(composite.get_frame(composite.duration - 0.05))
         freeze_frame = (
             ImageClip(last_frame)
             .resized((1080, 1920))
@@ -86,7 +92,7 @@ class GenerateFunFactCanvas(Step):
         freeze_composite = CompositeVideoClip([freeze_frame])
 
         context[self.name] = {
-            "final_frame": composite.get_frame(composite.duration - 0.05),
+            "final_frame": np.array(composite.get_frame(composite.duration - 0.05)),
         }
 
-        context["composites"] = context.get("composites", []) + [composite, freeze_composite]
+        emit_composites(context, [composite, freeze_composite])
@@ -2,10 +2,12 @@
 
 import os
 from core.domain.pipeline import Pipeline, ForeachStep
+from core.domain.compositor import CANVAS_COMPOSITOR
 from core.domain.caption_ai import GenerateCaptionWithSpeechInput, GenerateCaptionWithSpeechStep
 from core.domain.image_ai import GenerateImageStep
 from core.domain.video import ConcatenateVideoStep, ExportVideo, AddBackgroundMusicStep
 from countries_fun_facts.fun_fact_prompt import GenerateFunFactInputStep
+from core.domain.segment_encoder import EncodeSegmentsStep
 from countries_fun_facts.fun_facts_canvas import GenerateFunFactCanvas
 
 # Caminho da fonte utilizada para legendas
@@ -14,6 +16,9 @@ font_path = "/System/Library/Fonts/Supplemental/Arial.ttf"
 # Diretório de saída do vídeo (pode ser setado via variável de ambiente)
 OUTPUT_PATH = os.getenv("OUTPUT_PATH", "")
 
+# Compositor dos canvas deste pipeline (moviepy ou numpy)
+COMPOSITOR = os.getenv("FUN_FACTS_COMPOSITOR", CANVAS_COMPOSITOR)
+
 def build_pipeline_fun_fact() -> Pipeline:
     # Subpipeline responsável por gerar 1 curiosidade completa
     single_fact_pipeline = Pipeline(
@@ -27,7 +32,8 @@ def build_pipeline_fun_fact() -> Pipeline:
                     "prompt": context["current"]["fact_image_prompt"],
                     "output_key": "fact_image_path",
                     "size": "1024x1024",
-                    "use_tempfile": False,
+                    # Com os itens em paralelo cada imagem precisa do próprio arquivo
+                    "use_tempfile": True,
                 },
             ),
             GenerateCaptionWithSpeechStep(
@@ -56,8 +62,13 @@ def build_pipeline_fun_fact() -> Pipeline:
                     "audio_clip": context["generate_fun_fact_typing"]["audio_clip"],
                     "fact_image": context["generate_fact_image_step"]["fact_image_path"],
                     "country_code": context["current"]["country_code"],
+                    "compositor": COMPOSITOR,
                 },
             ),
+            EncodeSegmentsStep(
+                "encode_fact_segments",
+                "Codifica em background os vídeos da curiosidade (modo streamed)",
+            ),
         ]
     )
 
@@ -77,7 +88,8 @@ def build_pipeline_fun_fact() -> Pipeline:
                 "create_facts",
                 "Geração de vídeos para cada curiosidade",
                 lambda context: {"items": context["generate_fun_fact_input_step"]["facts"]},
-                single_fact_pipeline
+                single_fact_pipeline,
+                parallel=True,
             ),
             ConcatenateVideoStep(
                 "concatenate_videos",
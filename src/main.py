@@ -6,9 +6,20 @@ from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse
 from pydantic import BaseModel
+from typing import List, Optional
 from sse_starlette.sse import EventSourceResponse
+from core.commons.asset_cache import asset_cache
+from core.commons.text_cache import text_cache
+from core.commons.tts_cache import tts_cache
 from core.config.pipeline_factory import pipeline_factory
+from core.domain.cancellation import PipelineCancelled
+from core.domain.checkpoint_store import checkpoint_store
+from core.domain.export_profile import RENDITIONS, export_profile, rendition_path, renditions
+from core.domain.job_scheduler import RENDER_MODE, QueueFullError, create_job_scheduler
+from core.domain.metrics_sink import metrics_sink
+from core.domain.profiling import build_hooks, profile_dir, profile_path
 from core.domain.progress_manager import progress_manager
+from core.domain.render_executor import render_executor
 from core.domain.video_request_repository import VideoRequestRepository
 from core.domain.video_metrics_repository import VideoMetricsRepository
 
@@ -25,6 +36,22 @@ app.add_middleware(
 video_request_repo = VideoRequestRepository()
 video_metrics_repo = VideoMetricsRepository()
 
+@app.on_event("startup")
+async def restore_queued_jobs():
+  await job_scheduler.restore()
+
+@app.on_event("startup")
+async def warm_asset_cache():
+  # No modo worker quem renderiza (e aquece o cache) é o src/worker.py
+  if RENDER_MODE == "embedded":
+    render_executor.warm()
+
+@app.on_event("shutdown")
+async def flush_pending_metrics():
+  await job_scheduler.shutdown()
+  await metrics_sink.flush_all()
+  render_executor.shutdown()
+
 
 # Diretório onde os vídeos são salvos
 VIDEO_DIR = os.getenv("OUTPUT_PATH", "")
@@ -35,6 +62,18 @@ class VideoRequest(BaseModel):
   text: str
   n: int
   tone_prompt: str
+  # Hooks de profiling por step (cpu, tracemalloc, cprofile); None usa STEP_PROFILING
+  profiling: Optional[List[str]] = None
+  # Prioridade na fila de render: maior sai primeiro
+  priority: int = 0
+  # Perfil do export (draft, standard, high); None usa EXPORT_PROFILE
+  export_profile: Optional[str] = None
+  # Cópias extras em outros tamanhos (ex.: ["720p", "480p"]), do mesmo render; None usa EXPORT_RENDITIONS
+  renditions: Optional[List[str]] = None
+
+class ExportRequest(BaseModel):
+  export_profile: str
+  renditions: Optional[List[str]] = None
 
 class VideoResponse(BaseModel):
   text: str
@@ -49,9 +88,10 @@ def make_callback(video_id: str, loop):
         event = data.get("event")
 
         if event == "video_ready":
-          await video_request_repo.update_status(video_id, "completed")
+          # Um DELETE durante o encode final já gravou "cancelled": não sobrescreve
+          await video_request_repo.transition(video_id, "completed", ["pending", "processing"])
         elif event == "export_progress":
-          await video_request_repo.update_status(video_id, "processing")
+          await video_request_repo.transition(video_id, "processing", ["pending", "processing"])
       except Exception as e:
         print(f"Erro no callback do progresso do vídeo {video_id}: {e}")
 
@@ -59,55 +99,148 @@ def make_callback(video_id: str, loop):
 
   return callback
 
-# Função que executa a pipeline
-def run_pipeline_async(pipeline, context, loop):
-  progress_manager.subscribe(context["id"], make_callback(context["id"], loop))
+# Função que executa a pipeline no render executor configurado (RENDER_EXECUTOR=local|process)
+async def run_pipeline_async(request: dict):
+  video_id = request["id"]
+  progress_manager.subscribe(video_id, make_callback(video_id, asyncio.get_running_loop()))
   try:
-    pipeline.run(context)
+    await render_executor.run(request)
+  except PipelineCancelled:
+    # Status "cancelled" já gravado pelo DELETE /videos/{id}
+    pass
   except Exception as e:
-    print(f"Erro ao executar a pipeline do vídeo {context['id']}: {e}")
-    asyncio.run_coroutine_threadsafe(
-      video_request_repo.update_status(context["id"], "failed"),
-      loop
-    )
+    print(f"Erro ao executar a pipeline do vídeo {video_id}: {e}")
+    await video_request_repo.update_status(video_id, "failed")
 
-# Endpoint para iniciar geração de vídeo
-@app.post("/videos", response_model=VideoResponse)
-async def generate_video(req: VideoRequest):
+def validate_request(request: dict):
+  """Valida pipeline e opções antes de aceitar o pedido; a pipeline de fato é montada pelo render executor."""
   try:
-    pipeline = pipeline_factory.create(req.pipeline)
+    pipeline_factory.create(request["pipeline"])
+    build_hooks(request.get("profiling"))
+    export_profile(request.get("export_profile"))
+    renditions(request.get("renditions"))
   except ValueError as e:
     raise HTTPException(status_code=400, detail=str(e))
 
-  video_id = str(uuid4())
-  loop = asyncio.get_event_loop()
+# RENDER_MODE=worker: a API só enfileira, o render fica com os processos de worker.py
+job_scheduler = create_job_scheduler(run_pipeline_async, video_request_repo)
 
-  context = {
-    "id": video_id,
-    "text": req.text,
-    "n": req.n,
-    "number": req.n,
-    "tone_prompt": req.tone_prompt,
-    "pipeline": req.pipeline,
-    "loop": loop
-  }
+async def enqueue(request: dict, priority: int = 0):
+  try:
+    await job_scheduler.submit(request, priority)
+  except QueueFullError as e:
+    await video_request_repo.update_status(request["id"], "rejected")
+    raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
 
-  await video_request_repo.create({
+# Endpoint para iniciar geração de vídeo
+@app.post("/videos", response_model=VideoResponse)
+async def generate_video(req: VideoRequest):
+  video_id = str(uuid4())
+  request = {
     "id": video_id,
     "pipeline": req.pipeline,
     "text": req.text,
     "n": req.n,
     "tone_prompt": req.tone_prompt,
-    "status": "pending"
-  })
+    "profiling": req.profiling,
+    "export_profile": req.export_profile,
+    "renditions": req.renditions,
+  }
+  validate_request(request)
+
+  await video_request_repo.create({**request, "status": "pending"})
 
-  loop.run_in_executor(None, run_pipeline_async, pipeline, context, loop)
+  await enqueue(request, req.priority)
 
   return VideoResponse(
     text="Your video is being generated",
     code=video_id
   )
 
+# Endpoint para retomar um vídeo que falhou, reaproveitando os checkpoints dos steps
+@app.post("/videos/{video_id}/resume", response_model=VideoResponse)
+async def resume_video(video_id: str):
+  doc = await video_request_repo.get(video_id)
+  if not doc:
+    raise HTTPException(status_code=404, detail="Video request not found")
+  if doc.get("status") not in ("failed", "cancelled"):
+    raise HTTPException(status_code=409, detail="Only failed or cancelled videos can be resumed")
+
+  doc.pop("_id", None)
+  validate_request(doc)
+  await enqueue(doc, doc.get("priority", 0))
+
+  return VideoResponse(
+    text="Your video is being resumed",
+    code=video_id
+  )
+
+# Endpoint para exportar de novo um vídeo em outro perfil (ex.: draft aprovado -> high)
+# Roteiro, TTS e imagens vêm dos checkpoints; só a composição e o encode são refeitos
+@app.post("/videos/{video_id}/export", response_model=VideoResponse)
+async def reexport_video(video_id: str, req: ExportRequest):
+  doc = await video_request_repo.get(video_id)
+  if not doc:
+    raise HTTPException(status_code=404, detail="Video request not found")
+  if doc.get("status") not in ("completed", "failed", "cancelled"):
+    raise HTTPException(status_code=409, detail="Only finished videos can be exported again")
+  if not checkpoint_store.exists(video_id):
+    # Sem checkpoints o roteiro, o TTS e as imagens seriam gerados de novo: outro vídeo, não um novo export
+    raise HTTPException(status_code=409, detail="The checkpoints of this video were cleared; create a new video instead")
+
+  doc.pop("_id", None)
+  update = {"export_profile": req.export_profile}
+  if req.renditions is not None:
+    update["renditions"] = req.renditions
+  doc.update(update)
+  validate_request(doc)
+  await video_request_repo.update(video_id, update)
+  await enqueue(doc, doc.get("priority", 0))
+
+  return VideoResponse(
+    text=f"Your video is being exported with the {req.export_profile} profile",
+    code=video_id
+  )
+
+# Endpoint para cancelar um vídeo na fila ou em renderização
+@app.delete("/videos/{video_id}")
+async def cancel_video(video_id: str):
+  doc = await video_request_repo.get(video_id)
+  if not doc:
+    raise HTTPException(status_code=404, detail="Video request not found")
+
+  if doc.get("status") in ("completed", "failed", "cancelled"):
+    # Vídeo já terminado: o DELETE libera os checkpoints (depois disso não há resume nem novo export)
+    await asyncio.get_running_loop().run_in_executor(None, checkpoint_store.clear, video_id)
+    return {"id": video_id, "status": doc["status"], "checkpoints": "cleared"}
+
+  # Grava o status antes: a fila e os workers deixam de pegar o job e o progresso não o sobrescreve
+  if not await video_request_repo.transition(video_id, "cancelled", ["pending", "queued", "processing"]):
+    raise HTTPException(status_code=409, detail="The video finished before it could be cancelled")
+  await job_scheduler.cancel(video_id)
+
+  return {"id": video_id, "status": "cancelled"}
+
+# Endpoint com a profundidade da fila de render e tempos de espera
+@app.get("/videos/queue")
+async def get_queue_stats():
+  return await job_scheduler.stats()
+
+# Endpoint com o uso do cache de assets decodificados deste processo
+@app.get("/cache/assets")
+def get_asset_cache_stats():
+  return asset_cache.stats()
+
+# Endpoint com o uso do cache de rasters de texto deste processo
+@app.get("/cache/text")
+def get_text_cache_stats():
+  return text_cache.stats()
+
+# Endpoint com o uso do cache de áudios do TTS (hits/misses deste processo, arquivos e bytes do diretório)
+@app.get("/cache/tts")
+def get_tts_cache_stats():
+  return tts_cache.stats()
+
 # Endpoint para listar pipelines disponíveis
 @app.get("/pipelines")
 def list_pipelines():
@@ -162,8 +295,12 @@ async def video_progress_stream(video_id: str, request: Request):
 
 # Endpoint para baixar vídeo
 @app.get("/videos/file/{video_id}")
-def get_video(video_id: str):
+def get_video(video_id: str, rendition: Optional[str] = None):
   path = os.path.join(VIDEO_DIR, f"{video_id}.mp4")
+  if rendition:
+    if rendition not in RENDITIONS:
+      raise HTTPException(status_code=400, detail=f"Unknown rendition '{rendition}'. Use any of {tuple(RENDITIONS)}.")
+    path = rendition_path(path, rendition)
   if not os.path.exists(path):
     raise HTTPException(status_code=404, detail="Video not found")
   return FileResponse(path, media_type="video/mp4")
@@ -191,6 +328,29 @@ async def get_video_metrics(video_id: str):
   doc.pop("_id", None)
   return JSONResponse(content=doc)
 
+# Endpoint para listar os dumps de cProfile dos steps de um vídeo
+@app.get("/videos/metrics/{video_id}/profiles")
+def list_video_profiles(video_id: str):
+  try:
+    directory = profile_dir(video_id)
+  except ValueError:
+    raise HTTPException(status_code=404, detail="Profiles not found")
+  if not os.path.isdir(directory):
+    raise HTTPException(status_code=404, detail="Profiles not found")
+  return sorted(name for name in os.listdir(directory) if name.endswith(".prof"))
+
+# Endpoint para baixar o dump de cProfile (formato pstats) de um step
+@app.get("/videos/metrics/{video_id}/profiles/{file_name}")
+def get_video_profile(video_id: str, file_name: str):
+  # video_id e file_name chegam decodificados (%2E%2E vira ".."): só UUID, só .prof e só dentro de PROFILE_PATH
+  try:
+    path = profile_path(video_id, file_name)
+  except ValueError:
+    raise HTTPException(status_code=404, detail="Profile not found")
+  if not os.path.isfile(path):
+    raise HTTPException(status_code=404, detail="Profile not found")
+  return FileResponse(path, media_type="application/octet-stream", filename=os.path.basename(path))
+
 # Endpoint para consultar uma requisição de vídeo
 @app.get("/videos/{video_id}")
 async def get_video_request(video_id: str):
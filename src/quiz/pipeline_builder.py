@@ -9,8 +9,10 @@ from core.domain.caption_ai import (
     BackgroundConfig,
 )
 from core.domain.video import AddBackgroundMusicStep, ConcatenateVideoStep, ExportVideo
+from core.domain.compositor import CANVAS_COMPOSITOR
 from core.domain.debug import ExtractFrameStep
 from core.domain.progress_bar import GenerateProgressBarStep
+from core.domain.segment_encoder import EncodeSegmentsStep
 from quiz.quiz_prompt import GenerateQuizInputStep
 from quiz.quiz_canvas import (
     GenerateQuestionCanvas,
@@ -22,6 +24,8 @@ from dataclasses import dataclass
 
 font_path = "/System/Library/Fonts/Supplemental/Arial.ttf"
 OUTPUT_PATH = os.getenv("OUTPUT_PATH", "")
+# Compositor dos canvas deste pipeline (moviepy ou numpy)
+COMPOSITOR = os.getenv("QUIZ_COMPOSITOR", CANVAS_COMPOSITOR)
 
 # Adicionando uma nova classe de Step concreta
 class StoreCurrentQuestionStep(Step):
@@ -111,6 +115,7 @@ def build_pipeline_quiz() -> Pipeline:
                                 "background_path": "src/quiz/assets/background-quiz.png",
                                 "typing_clip": context["generate_question_typing"]["typing_clip"],
                                 "audio_clip": context["generate_question_typing"]["audio_clip"],
+                                "compositor": COMPOSITOR,
                             },
                         ),
                         ForeachStep(
@@ -148,6 +153,7 @@ def build_pipeline_quiz() -> Pipeline:
                                             "top_margin": context["last_canvas"]["top_margin"],
                                             "typing_clip": context["generate_answer_typing"]["typing_clip"],
                                             "audio_clip": context["generate_answer_typing"]["audio_clip"],
+                                            "compositor": COMPOSITOR,
                                         },
                                     ),
                                 ],
@@ -163,6 +169,7 @@ def build_pipeline_quiz() -> Pipeline:
                             lambda context: {
                                 "progress_clip": context["progress_bar"]["progress_clip"],
                                 "last_frame": context["last_canvas"]["last_frame"],
+                                "compositor": COMPOSITOR,
                             },
                         ),
                         GenerateCaptionStep(
@@ -193,11 +200,17 @@ def build_pipeline_quiz() -> Pipeline:
                                 "answers_clips": context["create_answers"].get("typings", []),
                                 "typing_clip": context["generate_correct_answer_typing"]["typing_clip"],
                                 "correct_answer_idx": next((i for i, answer in enumerate(context["store_current_question"]["current_question"]["answers"]) if answer.get("correct")), 0),
-                                "background_path": "src/quiz/assets/background-quiz.png"
+                                "background_path": "src/quiz/assets/background-quiz.png",
+                                "compositor": COMPOSITOR,
                             }
                         ),
+                        EncodeSegmentsStep(
+                            "encode_question_segments",
+                            "Codifica em background os vídeos da questão (modo streamed)",
+                        ),
                     ],
                 ),
+                parallel=True,
             ),
             ConcatenateVideoStep(
                 "join_video",
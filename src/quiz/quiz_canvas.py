@@ -1,7 +1,11 @@
 from cgitb import text
+import numpy as np
+from core.commons.asset_cache import asset_cache
 from core.domain import progress_bar
 from core.domain.pipeline import Step
-from moviepy import AudioFileClip, CompositeVideoClip, ImageClip, TextClip, VideoFileClip, vfx
+from core.domain.segment_encoder import emit_composites
+from core.domain.static_spans import composite_canvas
+from moviepy import CompositeVideoClip, ImageClip, TextClip, vfx
 from typing import Callable
 
 class GenerateQuestionCanvas(Step):
@@ -18,25 +22,25 @@ class GenerateQuestionCanvas(Step):
         audio_clip = input["audio_clip"]
 
         background = (
-            ImageClip(input["background_path"])
-            .resized((1080, 1920))
+            asset_cache.image_clip(input["background_path"], new_size=(1080, 1920))
             .with_duration(typing_clip.duration)
         )
 
         top_margin = 220
 
-        composite = CompositeVideoClip(
-            [background, typing_clip.with_position(("center", top_margin))]
+        composite = composite_canvas(
+            [background, typing_clip.with_position(("center", top_margin))],
+            compositor=input.get("compositor"),
         )
         composite.audio = audio_clip
-        context["composites"] = context.get("composites", []) + [composite]
 
         last_frame = {
-            "last_frame": composite.get_frame(composite.duration - 0.05),
+            "last_frame": np.array(composite.get_frame(composite.duration - 0.05)),
             "top_margin": top_margin + 320,
         }
         context["last_canvas"] = last_frame
         context[self.name] = last_frame
+        emit_composites(context, [composite])
 
 
 class GenerateAnswerCanvas(Step):
@@ -56,7 +60,7 @@ class GenerateAnswerCanvas(Step):
         )
 
         typing_clip = typing_clip.with_position(("center", top_margin))
-        composite = CompositeVideoClip([background, typing_clip])
+        composite = composite_canvas([background, typing_clip], compositor=input.get("compositor"))
         composite.audio = audio_clip
         
         # Inicializa a lista de typings se não existir
@@ -65,13 +69,13 @@ class GenerateAnswerCanvas(Step):
         if "typings" not in context["create_answers"]:
             context["create_answers"]["typings"] = []
 
-        context["composites"] = context.get("composites", []) + [composite]
         context["create_answers"]["typings"].append(typing_clip)
 
         context["last_canvas"] = {
-            "last_frame": composite.get_frame(composite.duration - 0.05),
+            "last_frame": np.array(composite.get_frame(composite.duration - 0.05)),
             "top_margin": top_margin,
         }
+        emit_composites(context, [composite])
 
 class GenerateProgressBarCanvas(Step):
     def __init__(self, name: str, description: str, input_transformer: Callable[[dict], dict] = None):
@@ -88,8 +92,7 @@ class GenerateProgressBarCanvas(Step):
         )
 
         clock = (
-            VideoFileClip("src/core/assets/clock-gif.gif", has_mask=True)
-            .resized(height=80)  # Adjust height as needed
+            asset_cache.video_clip("src/core/assets/clock-gif.gif", has_mask=True, height=80)  # Adjust height as needed
             .with_duration(progress_clip.duration)
         )
 
@@ -101,14 +104,14 @@ class GenerateProgressBarCanvas(Step):
         clock = clock.with_position(("center", 175))
 
         # Create the composite video
-        composite = CompositeVideoClip([background, progress_clip, clock])
+        composite = composite_canvas([background, progress_clip, clock], compositor=input.get("compositor"))
 
         # Update context
-        context["composites"] = context.get("composites", []) + [composite]
         context["last_canvas"] = {
-            "last_frame": composite.get_frame(composite.duration - 0.05),
+            "last_frame": np.array(composite.get_frame(composite.duration - 0.05)),
             "top_margin": 220,
         }
+        emit_composites(context, [composite])
 
 class GenerateCorrectAnswerCanvas(Step):
     def __init__(self, name: str, description: str, input_transformer: Callable[[dict], dict] = None):
@@ -121,8 +124,7 @@ class GenerateCorrectAnswerCanvas(Step):
         typing_clip = input["typing_clip"]
 
         background = (
-            ImageClip(input["background_path"])
-            .resized((1080, 1920))
+            asset_cache.image_clip(input["background_path"], new_size=(1080, 1920))
             .with_duration(2)
         )
 
@@ -136,7 +138,7 @@ class GenerateCorrectAnswerCanvas(Step):
 
         for idx, clip in enumerate(answers_clips):
             if idx == correct_answer_idx:
-                audio_file = AudioFileClip("src/quiz/assets/correct.mp3")
+                audio_file = asset_cache.audio_clip("src/quiz/assets/correct.mp3")
                 correct_clip = CompositeVideoClip([typing_clip]).with_effects(
                     [vfx.Blink(duration_on=0.35, duration_off=0.35)]
                 ).with_position(("center", top_margin))
@@ -149,11 +151,11 @@ class GenerateCorrectAnswerCanvas(Step):
 
             top_margin += gap
 
-        composite = CompositeVideoClip([background, question_typing] + positioned_answers).with_duration(2)
+        composite = composite_canvas([background, question_typing] + positioned_answers, compositor=input.get("compositor")).with_duration(2)
 
-        context["composites"] = context.get("composites", []) + [composite]
         context["last_canvas"] = {
-            "last_frame": composite.get_frame(composite.duration - 0.05),
+            "last_frame": np.array(composite.get_frame(composite.duration - 0.05)),
             "top_margin": top_margin,
         }
+        emit_composites(context, [composite])
 
@@ -22,6 +22,8 @@ def sanitize_output(output: str) -> str:
   return output.strip()
 
 class GenerateQuizInputStep(Step):
+  checkpointable = True
+
   def __init__(
     self,
     name: str,
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import signal
+import socket
+from uuid import uuid4
+from core.domain.cancellation import PipelineCancelled, cancellation_registry
+from core.domain.metrics_sink import metrics_sink
+from core.domain.render_executor import render_executor
+from core.domain.video_request_repository import VideoRequestRepository
+
+# Jobs renderizados ao mesmo tempo por processo de worker
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "1"))
+# Tempo sem heartbeat até outro worker poder retomar o job
+WORKER_LEASE_SECONDS = float(os.getenv("WORKER_LEASE_SECONDS", "60"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+WORKER_MAX_ATTEMPTS = int(os.getenv("WORKER_MAX_ATTEMPTS", "3"))
+
+class RenderWorker:
+  """Processo de render desacoplado da API: pega jobs "queued" em video_requests com lease e heartbeat.
+
+  Se o worker morrer, o lease expira e outro worker retoma o job (reaproveitando os checkpoints dos steps).
+  """
+
+  def __init__(
+    self,
+    repository: VideoRequestRepository,
+    executor=render_executor,
+    worker_id: str = None,
+    concurrency: int = WORKER_CONCURRENCY,
+    lease_seconds: float = WORKER_LEASE_SECONDS,
+    poll_interval: float = WORKER_POLL_INTERVAL,
+    max_attempts: int = WORKER_MAX_ATTEMPTS,
+  ):
+    self.repository = repository
+    self.executor = executor
+    self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:6]}"
+    self.concurrency = concurrency
+    self.lease_seconds = lease_seconds
+    self.heartbeat_interval = lease_seconds / 3
+    self.poll_interval = poll_interval
+    self.max_attempts = max_attempts
+    self.running = {}
+    self.stopping = asyncio.Event()
+
+  async def run_forever(self):
+    await self.repository.ensure_indexes()
+    print(f"👷 Worker {self.worker_id} aguardando jobs (concorrência {self.concurrency})")
+    while not self.stopping.is_set():
+      if not await self.poll_once():
+        try:
+          await asyncio.wait_for(self.stopping.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+          pass
+
+    # Para de pegar jobs novos, mas termina os que já estão rodando
+    if self.running:
+      await asyncio.gather(*self.running.values(), return_exceptions=True)
+
+  async def poll_once(self) -> bool:
+    """Pega jobs até encher os slots livres; retorna True se pegou algum."""
+    await self.repository.fail_expired(self.max_attempts)
+    claimed = False
+    while len(self.running) < self.concurrency:
+      doc = await self.repository.claim_next(self.worker_id, self.lease_seconds, self.max_attempts)
+      if doc is None:
+        break
+      doc.pop("_id", None)
+      self.running[doc["id"]] = asyncio.create_task(self.process(doc))
+      claimed = True
+    return claimed
+
+  async def process(self, request: dict):
+    video_id = request["id"]
+    print(f"🎬 Worker {self.worker_id} renderizando {video_id} (tentativa {request.get('attempts', 1)})")
+    heartbeat = asyncio.create_task(self.heartbeat(video_id))
+    try:
+      await self.executor.run(request)
+      await self.repository.release(video_id, self.worker_id, "completed")
+    except PipelineCancelled:
+      print(f"⚠️ Job {video_id} interrompido: cancelado ou lease perdido")
+    except Exception as e:
+      print(f"Erro ao executar a pipeline do vídeo {video_id}: {e}")
+      await self.repository.release(video_id, self.worker_id, "failed")
+    finally:
+      heartbeat.cancel()
+      self.running.pop(video_id, None)
+
+  async def heartbeat(self, video_id: str):
+    while True:
+      await asyncio.sleep(self.heartbeat_interval)
+      if not await self.repository.renew_lease(video_id, self.worker_id, self.lease_seconds):
+        # Job cancelado pela API (DELETE /videos/{id}) ou lease assumido por outro worker: para a pipeline
+        cancellation_registry.cancel(video_id)
+        return
+
+  def stop(self):
+    self.stopping.set()
+
+async def main():
+  worker = RenderWorker(VideoRequestRepository())
+  loop = asyncio.get_running_loop()
+  for sig in (signal.SIGINT, signal.SIGTERM):
+    loop.add_signal_handler(sig, worker.stop)
+  worker.executor.warm()
+  try:
+    await worker.run_forever()
+  finally:
+    await metrics_sink.flush_all()
+    worker.executor.shutdown()
+
+if __name__ == "__main__":
+  asyncio.run(main())